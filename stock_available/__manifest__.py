@@ -4,7 +4,7 @@
 
 {
     'name': 'Stock available to promise',
-    'version': '12.0.1.0.1',
+    'version': '12.0.1.1.0',
     'author': 'Numérigraphe, Sodexis, Odoo Community Association (OCA)',
     'website': 'https://github.com/OCA/stock-logistics-warehouse',
     'development_status': 'Production/Stable',
@@ -12,6 +12,8 @@
     'depends': ['stock'],
     'license': 'AGPL-3',
     'data': [
+        'security/ir.model.access.csv',
+        'security/stock_available_security.xml',
         'views/product_template_view.xml',
         'views/product_product_view.xml',
         'views/res_config_settings_views.xml',
@@ -6,3 +6,8 @@
 from . import product_product
 from . import product_template
 from . import res_config_settings
+from . import stock_available_cache
+from . import stock_available_cache_version
+from . import stock_available_snapshot
+from . import stock_move
+from . import stock_quant
@@ -2,9 +2,17 @@
 # Copyright 2016 Sodexis
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-from odoo import api, fields, models
+from odoo import api, fields, models, _
 from odoo.addons import decimal_precision as dp
 from odoo.addons.stock.models.product import OPERATORS
+from odoo.exceptions import UserError
+from odoo.tools.float_utils import float_round
+
+MOVE_TODO_STATES = ('waiting', 'confirmed', 'assigned', 'partially_available')
+CACHE_CONTEXT_KEYS = (
+    'location', 'warehouse', 'force_company', 'compute_child',
+    'company_owned', 'lot_id', 'owner_id', 'package_id', 'from_date',
+    'to_date')
 
 
 class ProductProduct(models.Model):
@@ -15,14 +23,49 @@ class ProductProduct(models.Model):
     """
     _inherit = 'product.product'
 
+    @api.multi
+    def _compute_quantities_dict_snapshot(self):
+        """ Same as _compute_quantities_dict, read from the snapshot """
+        snapshot = self.env['stock.available.snapshot']
+        domain_quant_loc, domain_move_in_loc, domain_move_out_loc = \
+            self._get_domain_locations()
+        terms = {}
+        for term, domain, qty_field in (
+                ('qty_available', domain_quant_loc, 'qty_available'),
+                ('incoming_qty', domain_move_in_loc, 'product_qty'),
+                ('outgoing_qty', domain_move_out_loc, 'product_qty')):
+            groups = snapshot.read_group(
+                [('product_id', 'in', self.ids)] + domain,
+                ['product_id', qty_field], ['product_id'], orderby='id')
+            terms[term] = {
+                group['product_id'][0]: group[qty_field] or 0.0
+                for group in groups}
+        res = {}
+        for product in self.with_context(prefetch_fields=False):
+            rounding = product.uom_id.rounding
+            res[product.id] = {
+                term: float_round(
+                    terms[term].get(product.id, 0.0),
+                    precision_rounding=rounding)
+                for term in terms}
+            res[product.id]['virtual_available'] = float_round(
+                terms['qty_available'].get(product.id, 0.0)
+                + terms['incoming_qty'].get(product.id, 0.0)
+                - terms['outgoing_qty'].get(product.id, 0.0),
+                precision_rounding=rounding)
+        return res
+
     @api.multi
     def _compute_available_quantities_dict(self):
-        stock_dict = self._compute_quantities_dict(
-            self._context.get('lot_id'),
-            self._context.get('owner_id'),
-            self._context.get('package_id'),
-            self._context.get('from_date'),
-            self._context.get('to_date'))
+        if self.env['stock.available.snapshot']._is_usable():
+            stock_dict = self._compute_quantities_dict_snapshot()
+        else:
+            stock_dict = self._compute_quantities_dict(
+                self._context.get('lot_id'),
+                self._context.get('owner_id'),
+                self._context.get('package_id'),
+                self._context.get('from_date'),
+                self._context.get('to_date'))
         res = {}
         for product in self:
             res[product.id] = {
@@ -32,10 +75,46 @@ class ProductProduct(models.Model):
             }
         return res, stock_dict
 
+    @api.model
+    def _get_available_quantities_cache_key(self):
+        """ Key of the quantities in stock.available.cache: everything
+        _compute_available_quantities_dict depends on, except the product
+        """
+        return (
+            self.env.uid, self.env.user.company_id.id,
+            tuple(repr(self._context.get(key))
+                  for key in CACHE_CONTEXT_KEYS))
+
+    @api.multi
+    def _get_available_quantities_dict(self):
+        """ Same as _compute_available_quantities_dict, memoized in
+        stock.available.cache
+        """
+        if not all(isinstance(product_id, int) for product_id in self.ids):
+            return self._compute_available_quantities_dict()
+        cache = self.env['stock.available.cache']
+        key = self._get_available_quantities_cache_key()
+        cached = cache._get(key, self.ids)
+        missing = self.browse([
+            product_id for product_id in self.ids
+            if product_id not in cached])
+        if missing:
+            res, stock_dict = missing._compute_available_quantities_dict()
+            cache._set(key, {
+                product_id: (
+                    dict(res[product_id]), dict(stock_dict[product_id]))
+                for product_id in missing.ids})
+        else:
+            res, stock_dict = {}, {}
+        for product_id, (product_res, product_stock) in cached.items():
+            res[product_id] = dict(product_res)
+            stock_dict[product_id] = dict(product_stock)
+        return res, stock_dict
+
     @api.multi
     @api.depends('virtual_available')
     def _compute_available_quantities(self):
-        res, _ = self._compute_available_quantities_dict()
+        res, _ = self._get_available_quantities_dict()
         for product in self:
             for key, value in res[product.id].items():
                 if hasattr(product, key):
@@ -57,20 +136,531 @@ class ProductProduct(models.Model):
         help="Quantity of this Product that could be produced using "
              "the materials already at hand.")
 
+    @api.model
+    def _get_immediately_usable_qty_terms(self):
+        """ Describe immediately_usable_qty as a signed sum of stock terms.
+        It is used by the SQL implementations (searches) which can't call
+        _compute_available_quantities_dict, so the modules overriding it
+        must keep this description consistent.
+        :return: dict {term: sign}, the terms being keys of
+                 _get_stock_term_queries
+        """
+        return {
+            'qty_available': 1.0,
+            'incoming_qty': 1.0,
+            'outgoing_qty': -1.0,
+        }
+
+    @api.model
+    def _get_immediately_usable_qty_python_products(self, domain=None):
+        """ Products whose immediately_usable_qty can't be described by
+        _get_immediately_usable_qty_terms, and must be evaluated in Python
+        when searching.
+        :param domain: list, domain restricting the products, all of them if
+                       None
+        :return: product.product recordset
+        """
+        return self.browse()
+
+    @api.model
+    def _get_stock_domains(self, domain_quant_loc=(), domain_move_in_loc=(),
+                           domain_move_out_loc=()):
+        """ Build the domains of the quants and moves making up the stock, as
+        _compute_quantities_dict does, from the lot_id, owner_id, package_id,
+        from_date and to_date context keys.
+        :return: dict of domains; the done moves are needed to go back in
+                 time when to_date is in the past, they are None otherwise
+        """
+        lot_id = self.env.context.get('lot_id')
+        owner_id = self.env.context.get('owner_id')
+        package_id = self.env.context.get('package_id')
+        from_date = self.env.context.get('from_date')
+        to_date = fields.Datetime.to_datetime(self.env.context.get('to_date'))
+        dates_in_the_past = to_date and to_date < fields.Datetime.now()
+
+        domain_quant = list(domain_quant_loc)
+        domain_move_in = list(domain_move_in_loc)
+        domain_move_out = list(domain_move_out_loc)
+        if lot_id is not None:
+            domain_quant += [('lot_id', '=', lot_id)]
+        if owner_id is not None:
+            domain_quant += [('owner_id', '=', owner_id)]
+            domain_move_in += [('restrict_partner_id', '=', owner_id)]
+            domain_move_out += [('restrict_partner_id', '=', owner_id)]
+        if package_id is not None:
+            domain_quant += [('package_id', '=', package_id)]
+        domain_move_in_done = domain_move_out_done = None
+        if dates_in_the_past:
+            domain_move_in_done = [
+                ('state', '=', 'done'), ('date', '>', to_date),
+            ] + domain_move_in
+            domain_move_out_done = [
+                ('state', '=', 'done'), ('date', '>', to_date),
+            ] + domain_move_out
+        if from_date:
+            domain_move_in += [('date', '>=', from_date)]
+            domain_move_out += [('date', '>=', from_date)]
+        if to_date:
+            domain_move_in += [('date', '<=', to_date)]
+            domain_move_out += [('date', '<=', to_date)]
+        return {
+            'quant': domain_quant,
+            'move_in': [('state', 'in', MOVE_TODO_STATES)] + domain_move_in,
+            'move_out': [('state', 'in', MOVE_TODO_STATES)] + domain_move_out,
+            'move_in_done': domain_move_in_done,
+            'move_out_done': domain_move_out_done,
+        }
+
+    @api.model
+    def _get_stock_term_query(self, model_name, domain, qty_field, sign=1.0,
+                              groupby=('product_id',)):
+        """ Build a query summing up a quantity per product
+        :param model_name: str, model holding a product_id field
+        :param domain: list, domain on model_name
+        :param qty_field: str, name of the column to sum up
+        :param sign: float, factor applied to the sum
+        :param groupby: columns of model_name to group by
+        :return: tuple (query, params), selecting (product_id, qty) rows
+                 (or the groupby columns and qty)
+        """
+        model = self.env[model_name]
+        query = model._where_calc(domain)
+        model._apply_ir_rules(query, 'read')
+        from_clause, where_clause, where_params = query.get_sql()
+        columns = ", ".join(
+            '"%s"."%s"' % (model._table, column) for column in groupby)
+        sql = """
+            SELECT {columns}, %s * SUM("{table}"."{field}") AS qty
+            FROM {from_clause}
+            {where}
+            GROUP BY {columns}
+        """.format(
+            columns=columns,
+            table=model._table,
+            field=qty_field,
+            from_clause=from_clause,
+            where=where_clause and "WHERE %s" % where_clause or "",
+        )
+        return sql, [sign] + where_params
+
+    @api.model
+    def _get_stock_term_queries(self):
+        """ Build the SQL equivalent of _compute_quantities_dict.
+        The same context keys are honoured (location, warehouse, lot_id,
+        owner_id, package_id, from_date and to_date) but the products are
+        not restricted.
+        :return: dict {term: [(query, params)]}, the queries selecting
+                 (product_id, qty) rows to be added up
+        """
+        if self.env['stock.available.snapshot']._is_usable():
+            domain_quant_loc, domain_move_in_loc, domain_move_out_loc = \
+                self._get_domain_locations()
+            return {
+                'qty_available': [self._get_stock_term_query(
+                    'stock.available.snapshot', domain_quant_loc,
+                    'qty_available')],
+                'incoming_qty': [self._get_stock_term_query(
+                    'stock.available.snapshot', domain_move_in_loc,
+                    'product_qty')],
+                'outgoing_qty': [self._get_stock_term_query(
+                    'stock.available.snapshot', domain_move_out_loc,
+                    'product_qty')],
+            }
+        domains = self._get_stock_domains(*self._get_domain_locations())
+        queries = {
+            'qty_available': [self._get_stock_term_query(
+                'stock.quant', domains['quant'], 'quantity')],
+            'incoming_qty': [self._get_stock_term_query(
+                'stock.move', domains['move_in'], 'product_qty')],
+            'outgoing_qty': [self._get_stock_term_query(
+                'stock.move', domains['move_out'], 'product_qty')],
+        }
+        if domains['move_in_done'] is not None:
+            # Go back in time from the current quants
+            queries['qty_available'] += [
+                self._get_stock_term_query(
+                    'stock.move', domains['move_in_done'], 'product_qty',
+                    sign=-1.0),
+                self._get_stock_term_query(
+                    'stock.move', domains['move_out_done'], 'product_qty'),
+            ]
+        return queries
+
+    @api.model
+    def _get_immediately_usable_qty_query(self):
+        """ Build the SQL equivalent of the immediately_usable_qty of the
+        products which are not evaluated in Python.
+        :return: tuple (query, params), selecting (product_id, qty) rows to
+                 be added up
+        """
+        stock_queries = self._get_stock_term_queries()
+        subqueries = []
+        params = []
+        for term, sign in self._get_immediately_usable_qty_terms().items():
+            for query, query_params in stock_queries[term]:
+                subqueries.append(
+                    "SELECT product_id, %s * qty AS qty FROM ({}) AS term"
+                    .format(query))
+                params += [sign] + query_params
+        return " UNION ALL ".join(subqueries), params
+
+    @api.model
+    def _compute_immediately_usable_qty_sql(self, group_ids,
+                                            groupby='product_id',
+                                            exclude_product_ids=None):
+        """ Sum up immediately_usable_qty in SQL per product or template,
+        without rounding.
+        :param group_ids: ids of the products or templates
+        :param groupby: 'product_id' or 'product_tmpl_id'
+        :param exclude_product_ids: ids of the products to leave out of the
+                                    sums, usually the ones to be evaluated in
+                                    Python
+        :return: dict {group_id: qty}, without the groups having no stock
+        """
+        if not group_ids:
+            return {}
+        terms, params = self._get_immediately_usable_qty_query()
+        group_column = 'product.id'
+        where = []
+        if groupby == 'product_tmpl_id':
+            group_column = 'product.product_tmpl_id'
+            # Templates only aggregate their active variants
+            where.append('product.active')
+        where.append('%s IN %%s' % group_column)
+        params.append(tuple(group_ids))
+        if exclude_product_ids:
+            where.append('product.id NOT IN %s')
+            params.append(tuple(exclude_product_ids))
+        query = """
+            SELECT {group_column}, SUM(stock.qty)
+            FROM ({terms}) AS stock
+            JOIN product_product product ON product.id = stock.product_id
+            WHERE {where}
+            GROUP BY {group_column}
+        """.format(
+            group_column=group_column,
+            terms=terms,
+            where=" AND ".join(where),
+        )
+        # pylint: disable=sql-injection
+        self.env.cr.execute(query, params)
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _search_immediately_usable_qty_sql(self, operator, value,
+                                           groupby='product_id',
+                                           exclude_ids=None):
+        """ Compare immediately_usable_qty to a value in SQL.
+        Only the products having stock data are returned by the query.
+        When the products without any stock (hence a quantity of 0) match,
+        the products which do NOT match are returned instead.
+        :param operator: str
+        :param value: float
+        :param groupby: 'product_id' or 'product_tmpl_id'
+        :param exclude_ids: ids of the groups to leave out of the query
+        :return: tuple (list of ids, whether the ids don't match)
+        """
+        if operator not in OPERATORS:
+            raise UserError(_('Invalid domain operator %s') % operator)
+        if not isinstance(value, (float, int)):
+            raise UserError(_('Invalid domain right operand %s') % value)
+
+        terms, params = self._get_immediately_usable_qty_query()
+
+        negate = OPERATORS[operator](0.0, value)
+        group_column = 'product.id'
+        where = []
+        if groupby == 'product_tmpl_id':
+            group_column = 'product.product_tmpl_id'
+            # Templates only aggregate their active variants
+            where.append('product.active')
+        if exclude_ids:
+            where.append('%s NOT IN %%s' % group_column)
+            params.append(tuple(exclude_ids))
+        params.append(value)
+        # Rounded to the unit of measure, as _compute_quantities_dict does
+        query = """
+            SELECT {group_column}
+            FROM ({terms}) AS stock
+            JOIN product_product product ON product.id = stock.product_id
+            JOIN product_template template
+                ON template.id = product.product_tmpl_id
+            JOIN uom_uom uom ON uom.id = template.uom_id
+            {where}
+            GROUP BY {group_column}, uom.rounding
+            HAVING {negate}(
+                ROUND(SUM(stock.qty)::numeric / uom.rounding::numeric)
+                * uom.rounding::numeric {operator} %s)
+        """.format(
+            group_column=group_column,
+            terms=terms,
+            where=where and "WHERE %s" % " AND ".join(where) or "",
+            negate=negate and "NOT " or "",
+            operator=operator,
+        )
+        # pylint: disable=sql-injection
+        self.env.cr.execute(query, params)
+        return [row[0] for row in self.env.cr.fetchall()], negate
+
     @api.model
     def _search_immediately_usable_qty(self, operator, value):
         """ Search function for the immediately_usable_qty field.
-        The search is quite similar to the Odoo search about quantity available
-        (addons/stock/models/product.py,253; _search_product_quantity function)
+        The quantities are summed up in SQL, so that the cost depends on the
+        stock data rather than on the size of the catalog. The products
+        which can't be evaluated that way are evaluated in Python.
         :param operator: str
         :param value: str
         :return: list of tuple (domain)
         """
-        products = self.search([])
-        # Force prefetch
-        products.mapped("immediately_usable_qty")
-        product_ids = []
-        for product in products:
-            if OPERATORS[operator](product.immediately_usable_qty, value):
-                product_ids.append(product.id)
-        return [('id', 'in', product_ids)]
+        python_products = self._get_immediately_usable_qty_python_products()
+        product_ids, negate = self._search_immediately_usable_qty_sql(
+            operator, value, exclude_ids=python_products.ids)
+        python_product_ids = [
+            product.id for product in python_products
+            if OPERATORS[operator](product.immediately_usable_qty, value)]
+        if negate:
+            product_ids += list(
+                set(python_products.ids) - set(python_product_ids))
+            return [('id', 'not in', product_ids)]
+        return [('id', 'in', product_ids + python_product_ids)]
+
+    @api.model
+    def _get_stock_matrix_query(self, model_name, domain, qty_field,
+                                direction, location_ids, sign=1.0):
+        """ Build a query summing up a quantity per product and location.
+        The locations include their children.
+        :param direction: 'quant' (the stock in the location), 'in' (the
+                          moves entering the location) or 'out' (the moves
+                          leaving the location)
+        :return: tuple (query, params), selecting
+                 (product_id, location_id, qty) rows
+        """
+        model = self.env[model_name]
+        query = model._where_calc(domain)
+        model._apply_ir_rules(query, 'read')
+        from_clause, where_clause, where_params = query.get_sql()
+        inside = "matrix_location.parent_path LIKE " \
+                 "matrix_scope.parent_path || '%%'"
+        outside = "matrix_other.parent_path NOT LIKE " \
+                  "matrix_scope.parent_path || '%%'"
+        if direction == 'quant':
+            tables = ["stock_location matrix_location"]
+            conditions = [
+                'matrix_location.id = "{table}".location_id', inside]
+        elif direction == 'in':
+            tables = ["stock_location matrix_location",
+                      "stock_location matrix_other"]
+            conditions = [
+                'matrix_location.id = "{table}".location_dest_id',
+                'matrix_other.id = "{table}".location_id',
+                inside, outside]
+        else:
+            tables = ["stock_location matrix_location",
+                      "stock_location matrix_other"]
+            conditions = [
+                'matrix_location.id = "{table}".location_id',
+                'matrix_other.id = "{table}".location_dest_id',
+                inside, outside]
+        conditions = [
+            condition.format(table=model._table) for condition in conditions]
+        conditions.append("matrix_scope.id IN %s")
+        if where_clause:
+            conditions.append(where_clause)
+        sql = """
+            SELECT "{table}".product_id, matrix_scope.id,
+                %s * SUM("{table}"."{field}")
+            FROM {from_clause}, {tables}, stock_location matrix_scope
+            WHERE {conditions}
+            GROUP BY "{table}".product_id, matrix_scope.id
+        """.format(
+            table=model._table,
+            field=qty_field,
+            from_clause=from_clause,
+            tables=", ".join(tables),
+            conditions=" AND ".join(conditions),
+        )
+        return sql, [sign, tuple(location_ids)] + where_params
+
+    @api.multi
+    def _compute_quantities_matrix(self, locations):
+        """ Compute the stock quantities of the products in each location,
+        with one grouped query per kind of quantity.
+        The locations include their children, and the lot_id, owner_id,
+        package_id, from_date, to_date and force_company context keys are
+        honoured as in _compute_quantities_dict.
+        :param locations: stock.location recordset
+        :return: dict {product_id: {location_id: {qty_available,
+                 incoming_qty, outgoing_qty, virtual_available}}}
+        """
+        domain = [('product_id', 'in', self.ids)]
+        company_id = self.env.context.get('force_company')
+        if company_id:
+            domain += [('company_id', '=', company_id)]
+        domains = self._get_stock_domains(domain, domain, domain)
+        queries = [
+            ('qty_available', self._get_stock_matrix_query(
+                'stock.quant', domains['quant'], 'quantity', 'quant',
+                locations.ids)),
+            ('incoming_qty', self._get_stock_matrix_query(
+                'stock.move', domains['move_in'], 'product_qty', 'in',
+                locations.ids)),
+            ('outgoing_qty', self._get_stock_matrix_query(
+                'stock.move', domains['move_out'], 'product_qty', 'out',
+                locations.ids)),
+        ]
+        if domains['move_in_done'] is not None:
+            # Go back in time from the current quants
+            queries += [
+                ('qty_available', self._get_stock_matrix_query(
+                    'stock.move', domains['move_in_done'], 'product_qty',
+                    'in', locations.ids, sign=-1.0)),
+                ('qty_available', self._get_stock_matrix_query(
+                    'stock.move', domains['move_out_done'], 'product_qty',
+                    'out', locations.ids)),
+            ]
+        sums = {}
+        for key, (query, params) in queries:
+            # pylint: disable=sql-injection
+            self.env.cr.execute(query, params)
+            for product_id, location_id, qty in self.env.cr.fetchall():
+                product_sums = sums.setdefault((product_id, location_id), {})
+                product_sums[key] = product_sums.get(key, 0.0) + qty
+
+        res = {}
+        for product in self.with_context(prefetch_fields=False):
+            rounding = product.uom_id.rounding
+            res[product.id] = {}
+            for location in locations:
+                product_sums = sums.get((product.id, location.id), {})
+                quantities = {
+                    key: float_round(
+                        product_sums.get(key, 0.0),
+                        precision_rounding=rounding)
+                    for key in ('qty_available', 'incoming_qty',
+                                'outgoing_qty')}
+                quantities['virtual_available'] = float_round(
+                    quantities['qty_available'] +
+                    quantities['incoming_qty'] -
+                    quantities['outgoing_qty'],
+                    precision_rounding=rounding)
+                res[product.id][location.id] = quantities
+        return res
+
+    @api.multi
+    def _compute_available_quantities_matrix(self, locations):
+        """ Same as _compute_available_quantities_dict, for each location
+        :param locations: stock.location recordset
+        :return: tuple of dicts {product_id: {location_id: quantities}}
+                 with the available quantities and the stock quantities
+        """
+        stock_matrix = self._compute_quantities_matrix(locations)
+        res = {}
+        for product in self:
+            res[product.id] = {}
+            for location in locations:
+                res[product.id][location.id] = {
+                    'immediately_usable_qty': stock_matrix[product.id][
+                        location.id]['virtual_available'],
+                    'potential_qty': 0.0,
+                }
+        return res, stock_matrix
+
+    @api.model
+    def get_available_quantities_matrix(self, product_ids, location_ids):
+        """ Get the quantities available to promise of many products in many
+        locations at once (the locations include their children).
+        :param product_ids: list of product ids
+        :param location_ids: list of location ids
+        :return: list of dicts with the keys product_id, location_id,
+                 immediately_usable_qty and potential_qty
+        """
+        products = self.browse(product_ids)
+        locations = self.env['stock.location'].browse(location_ids)
+        res, _ = products._compute_available_quantities_matrix(locations)
+        return [
+            dict(quantities, product_id=product_id, location_id=location_id)
+            for product_id, product_res in res.items()
+            for location_id, quantities in product_res.items()
+        ]
+
+    @api.multi
+    def _compute_available_quantities_forecast(self, date_to):
+        """ Compute the projected quantities available to promise of the
+        products up to a date, in a single sweep over the pending moves
+        ordered by date.
+        The location, warehouse, lot_id, owner_id and package_id context keys
+        are honoured. Each quantity is the one computed with this date as
+        to_date in the context.
+        :param date_to: datetime, horizon of the forecast
+        :return: dict {product_id: [(date, qty)]}, the quantity changing at
+                 each date; the first date is now, with the overdue moves
+        """
+        now = fields.Datetime.now()
+        date_to = fields.Datetime.to_datetime(date_to)
+        products = self.with_context(from_date=None, to_date=None)
+        terms = products._get_immediately_usable_qty_terms()
+        stock_dict = products._compute_quantities_dict(
+            self.env.context.get('lot_id'),
+            self.env.context.get('owner_id'),
+            self.env.context.get('package_id'))
+
+        domains = products._get_stock_domains(
+            *products._get_domain_locations())
+        domain = [('product_id', 'in', self.ids), ('date', '<=', date_to)]
+        subqueries = []
+        params = []
+        for term, key in (('incoming_qty', 'move_in'),
+                          ('outgoing_qty', 'move_out')):
+            if term not in terms:
+                continue
+            query, query_params = products._get_stock_term_query(
+                'stock.move', domains[key] + domain, 'product_qty',
+                sign=terms[term], groupby=('product_id', 'date'))
+            subqueries.append(query)
+            params += query_params
+        changes = []
+        if subqueries:
+            # pylint: disable=sql-injection
+            self.env.cr.execute("""
+                SELECT product_id, date, SUM(qty)
+                FROM ({}) AS moves
+                GROUP BY product_id, date
+                ORDER BY product_id, date
+            """.format(" UNION ALL ".join(subqueries)), params)
+            changes = self.env.cr.fetchall()
+
+        res = {}
+        for product in self:
+            res[product.id] = [(now, terms.get('qty_available', 0.0) *
+                                stock_dict[product.id]['qty_available'])]
+        for product_id, date, qty in changes:
+            forecast = res[product_id]
+            last_date, last_qty = forecast[-1]
+            if date <= last_date:
+                forecast[-1] = (last_date, last_qty + qty)
+            else:
+                forecast.append((date, last_qty + qty))
+        for product in self.with_context(prefetch_fields=False):
+            rounding = product.uom_id.rounding
+            res[product.id] = [
+                (date, float_round(qty, precision_rounding=rounding))
+                for date, qty in res[product.id]]
+        return res
+
+    @api.model
+    def get_available_quantities_forecast(self, product_ids, date_to):
+        """ Get the projected quantities available to promise of many
+        products, as the list of the dates at which they change.
+        :param product_ids: list of product ids
+        :param date_to: horizon of the forecast
+        :return: list of dicts with the keys product_id and forecast, a list
+                 of (date, quantity) pairs
+        """
+        products = self.browse(product_ids)
+        res = products._compute_available_quantities_forecast(date_to)
+        return [{
+            'product_id': product_id,
+            'forecast': [
+                (fields.Datetime.to_string(date), qty)
+                for date, qty in forecast],
+        } for product_id, forecast in res.items()]
@@ -5,6 +5,7 @@
 from odoo import models, fields, api
 from odoo.addons import decimal_precision as dp
 from odoo.addons.stock.models.product import OPERATORS
+from odoo.tools.float_utils import float_round
 
 
 class ProductTemplate(models.Model):
@@ -22,22 +23,52 @@ class ProductTemplate(models.Model):
 
     @api.multi
     def _compute_available_quantities_dict(self):
-        variants_dict, _ = self.mapped(
-            'product_variant_ids')._compute_available_quantities_dict()
+        """ Aggregate the quantities of the variants per template.
+        The variants which can be evaluated in SQL are summed up per
+        template by the database, so that the cost depends on the number of
+        templates rather than on the number of variants. The other ones are
+        computed one by one.
+        """
+        products = self.env['product.product']
+        if all(isinstance(template_id, int) for template_id in self.ids):
+            python_variants = products.\
+                _get_immediately_usable_qty_python_products([
+                    ('product_tmpl_id', 'in', self.ids),
+                    ('active', '=', True),
+                ])
+            sql_qties = products._compute_immediately_usable_qty_sql(
+                self.ids, groupby='product_tmpl_id',
+                exclude_product_ids=python_variants.ids)
+            template_variants = [
+                (variant.product_tmpl_id.id, variant)
+                for variant in python_variants]
+        else:
+            # New records, nothing to read in the database
+            python_variants = self.mapped('product_variant_ids')
+            sql_qties = {}
+            template_variants = [
+                (template.id, variant) for template in self
+                for variant in template.product_variant_ids]
+        variants_dict, _ = python_variants._get_available_quantities_dict()
         res = {}
         for template in self:
-            immediately_usable_qty = sum(
-                [variants_dict[p.id]["immediately_usable_qty"] -
-                 variants_dict[p.id]["potential_qty"] for p in
-                 template.product_variant_ids])
-            potential_qty = max(
-                [variants_dict[p.id]["potential_qty"] for p in
-                 template.product_variant_ids] or [0.0])
             res[template.id] = {
-                "immediately_usable_qty": immediately_usable_qty +
-                potential_qty,
-                "potential_qty": potential_qty,
+                "immediately_usable_qty": float_round(
+                    sql_qties.get(template.id, 0.0),
+                    precision_rounding=template.uom_id.rounding),
+                "potential_qty": 0.0,
             }
+        for template_id, variant in template_variants:
+            template_res = res[template_id]
+            variant_res = variants_dict[variant.id]
+            template_res["immediately_usable_qty"] += \
+                variant_res["immediately_usable_qty"] - \
+                variant_res["potential_qty"]
+            template_res["potential_qty"] = max(
+                template_res["potential_qty"], variant_res["potential_qty"])
+        for template_res in res.values():
+            template_res["immediately_usable_qty"] += \
+                template_res["potential_qty"]
         return res
 
     immediately_usable_qty = fields.Float(
@@ -61,17 +92,25 @@ class ProductTemplate(models.Model):
     @api.model
     def _search_immediately_usable_qty(self, operator, value):
         """ Search function for the immediately_usable_qty field.
-        The search is quite similar to the Odoo search about quantity available
-        (addons/stock/models/product.py,253; _search_product_quantity function)
+        The quantities of the variants are summed up per template in SQL
+        (see product.product). The templates having a variant which can't be
+        evaluated that way are evaluated in Python.
         :param operator: str
         :param value: str
         :return: list of tuple (domain)
         """
-        products = self.search([])
-        # Force prefetch
-        products.mapped("immediately_usable_qty")
-        product_ids = []
-        for product in products:
-            if OPERATORS[operator](product.immediately_usable_qty, value):
-                product_ids.append(product.id)
-        return [('id', 'in', product_ids)]
+        products = self.env['product.product']
+        python_templates = products.\
+            _get_immediately_usable_qty_python_products().mapped(
+                'product_tmpl_id')
+        template_ids, negate = products._search_immediately_usable_qty_sql(
+            operator, value, groupby='product_tmpl_id',
+            exclude_ids=python_templates.ids)
+        python_template_ids = [
+            template.id for template in python_templates
+            if OPERATORS[operator](template.immediately_usable_qty, value)]
+        if negate:
+            template_ids += list(
+                set(python_templates.ids) - set(python_template_ids))
+            return [('id', 'not in', template_ids)]
+        return [('id', 'in', template_ids + python_template_ids)]
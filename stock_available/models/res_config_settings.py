@@ -52,18 +52,42 @@ class ResConfigSettings(models.TransientModel):
              "Only the quantity fields have meaning for computing stock",
     )
 
+    stock_available_use_snapshot = fields.Boolean(
+        string='Use a snapshot of the stock',
+        help="Read the quantities available to promise from a table kept "
+             "up to date when the stock changes, instead of computing them "
+             "from the quants and moves.\n"
+             "Only the quantities without lot, owner, package or date are "
+             "read from the snapshot.")
+
     @api.model
     def get_values(self):
         res = super(ResConfigSettings, self).get_values()
-        res.update(stock_available_mrp_based_on=self.env[
-            'ir.config_parameter'].sudo().get_param(
-                'stock_available_mrp_based_on',
-                'qty_available')
+        icp = self.env['ir.config_parameter'].sudo()
+        res.update(
+            stock_available_mrp_based_on=icp.get_param(
+                'stock_available_mrp_based_on', 'qty_available'),
+            stock_available_use_snapshot=bool(icp.get_param(
+                'stock_available_use_snapshot')),
         )
         return res
 
     @api.multi
     def set_values(self):
         super(ResConfigSettings, self).set_values()
-        self.env['ir.config_parameter'].sudo().set_param(
+        icp = self.env['ir.config_parameter'].sudo()
+        icp.set_param(
             'stock_available_mrp_based_on', self.stock_available_mrp_based_on)
+        snapshot = self.env['stock.available.snapshot']
+        was_enabled = snapshot._is_enabled()
+        icp.set_param(
+            'stock_available_use_snapshot',
+            self.stock_available_use_snapshot and 'True' or False)
+        if self.stock_available_use_snapshot and not was_enabled:
+            # The snapshot wasn't kept up to date
+            snapshot.rebuild()
+
+    @api.multi
+    def action_rebuild_stock_available_snapshot(self):
+        self.env['stock.available.snapshot'].rebuild()
+        return True
@@ -0,0 +1,201 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from collections import Counter
+from functools import partial
+from weakref import WeakKeyDictionary
+
+from odoo import api, models, sql_db
+from odoo.tools.lru import LRU
+
+# Number of values kept in the shared cache of each database
+SHARED_CACHE_SIZE = 8192
+
+# {cursor: {namespace: {key: value}}}, cleared at the end of the transaction
+_transaction_caches = WeakKeyDictionary()
+# {dbname: LRU {(key, id): (versions, value)}}, per worker
+_shared_caches = {}
+# {dbname: Counter({'hits': int, 'misses': int})}, per worker
+_stats = {}
+
+
+def _increase_versions(dbname, ids):
+    """ Increase the versions of the stock of some products, once the
+    transaction changing it is committed. The statement is committed on its
+    own, so that the transactions changing the stock of the same products
+    don't wait for each other to end, nor conflict.
+    :param ids: dict {product_id: True}, 0 standing for all the products
+    """
+    with sql_db.db_connect(dbname).cursor() as cr:
+        cr.autocommit(True)
+        cr.execute("""
+            INSERT INTO stock_available_cache_version (product_id, version)
+            SELECT product_id, 1 FROM unnest(%s) AS product_id
+            ON CONFLICT (product_id) DO UPDATE
+            SET version = stock_available_cache_version.version + 1
+        """, (sorted(ids),))
+
+
+class StockAvailableCache(models.AbstractModel):
+
+    """ Cache of the quantities available to promise.
+    The values are kept for the current transaction or, if the
+    stock_available_cache_shared system parameter is set, in a cache shared
+    by the requests of a worker. The shared values are stored with the
+    versions of the stock of their products (see
+    stock.available.cache.version) and dropped when they are outdated, so a
+    change of the stock of a product only drops the values of that product.
+    """
+    _name = 'stock.available.cache'
+    _description = 'Cache of the quantities available to promise'
+
+    @api.model
+    def _is_shared(self):
+        return bool(self.env['ir.config_parameter'].sudo().get_param(
+            'stock_available_cache_shared'))
+
+    @api.model
+    def _get_transaction_cache(self, namespace):
+        """ Get a dict living as long as the current transaction
+        :param namespace: str, name of the dict
+        :rtype: dict
+        """
+        cr = self.env.cr
+        caches = _transaction_caches.get(cr)
+        if caches is None:
+            caches = _transaction_caches[cr] = {}
+            cr.after('commit', partial(_transaction_caches.pop, cr, None))
+            cr.after('rollback', partial(_transaction_caches.pop, cr, None))
+        return caches.setdefault(namespace, {})
+
+    @api.model
+    def _get_shared_cache(self):
+        """ Get the cache shared by the requests of this worker
+        :rtype: odoo.tools.lru.LRU
+        """
+        dbname = self.env.cr.dbname
+        cache = _shared_caches.get(dbname)
+        if cache is None:
+            cache = _shared_caches.setdefault(dbname, LRU(SHARED_CACHE_SIZE))
+        return cache
+
+    @api.model
+    def _get_versions(self, ids):
+        """ Get the versions of the stock of some products, as seen by the
+        current transaction
+        :param ids: list of product ids
+        :return: dict {id: (version of all the products, version of the
+                 product)}
+        """
+        versions = self._get_transaction_cache('versions')
+        missing = {id_ for id_ in ids if id_ not in versions}
+        if 0 not in versions:
+            missing.add(0)
+        if missing:
+            self.env.cr.execute("""
+                SELECT product_id, version
+                FROM stock_available_cache_version
+                WHERE product_id IN %s
+            """, (tuple(missing),))
+            found = dict(self.env.cr.fetchall())
+            for id_ in missing:
+                versions[id_] = found.get(id_, 0)
+        return {id_: (versions[0], versions[id_]) for id_ in ids}
+
+    @api.model
+    def _get(self, key, ids):
+        """ Get the cached values of some records
+        :param key: hashable, the parameters of the computation
+        :param ids: list of record ids
+        :return: dict {id: value} of the values found in the cache
+        """
+        cache = self._get_transaction_cache('quantities').get(key, {})
+        values = {id_: cache[id_] for id_ in ids if id_ in cache}
+        if self._is_shared():
+            shared_cache = self._get_shared_cache()
+            entries = {}
+            for id_ in ids:
+                if id_ in values:
+                    continue
+                try:
+                    entries[id_] = shared_cache[(key, id_)]
+                except KeyError:
+                    continue
+            if entries:
+                versions = self._get_versions(list(entries))
+                for id_, (entry_versions, value) in entries.items():
+                    if entry_versions == versions[id_]:
+                        values[id_] = value
+        stats = _stats.setdefault(self.env.cr.dbname, Counter())
+        stats['hits'] += len(values)
+        stats['misses'] += len(ids) - len(values)
+        return values
+
+    @api.model
+    def _set(self, key, values):
+        """ Put the values of some records in the cache
+        :param key: hashable, the parameters of the computation
+        :param values: dict {id: value}
+        """
+        shared = {}
+        if self._is_shared():
+            # The values of the stock changed by this transaction may not be
+            # committed, so they are kept in the transaction
+            touched = self._get_transaction_cache('touched')
+            if 0 not in touched:
+                shared = {
+                    id_: value for id_, value in values.items()
+                    if id_ not in touched}
+        if shared:
+            shared_cache = self._get_shared_cache()
+            versions = self._get_versions(list(shared))
+            for id_, value in shared.items():
+                shared_cache[(key, id_)] = (versions[id_], value)
+        if len(shared) < len(values):
+            self._get_transaction_cache('quantities').setdefault(
+                key, {}).update({
+                    id_: value for id_, value in values.items()
+                    if id_ not in shared})
+
+    @api.model
+    def _get_invalidated_ids(self, ids):
+        """ Get the products whose values depend on the stock of some
+        products
+        :param ids: list of product ids
+        :return: set of product ids, including the given ones
+        """
+        return set(ids)
+
+    @api.model
+    def invalidate(self, product_ids=None):
+        """ Forget the cached values, to be called when the stock changes
+        :param product_ids: list of the ids of the products whose stock
+                            changed, all of them if None
+        """
+        self._get_transaction_cache('quantities').clear()
+        if not self._is_shared():
+            return
+        touched = self._get_transaction_cache('touched')
+        if not touched:
+            self.env.cr.after('commit', partial(
+                _increase_versions, self.env.cr.dbname, touched))
+        if product_ids is None:
+            ids = {0}
+        else:
+            ids = self._get_invalidated_ids(product_ids)
+        # The versions are increased after the commit, until then the values
+        # of these products aren't shared
+        touched.update(dict.fromkeys(ids, True))
+
+    @api.model
+    def get_stats(self):
+        """ Get the number of hits and misses of the cache in this worker
+        :return: dict with the keys hits and misses
+        """
+        stats = _stats.get(self.env.cr.dbname, Counter())
+        return {'hits': stats['hits'], 'misses': stats['misses']}
+
+    @api.model
+    def reset_stats(self):
+        _stats.pop(self.env.cr.dbname, None)
+        return True
@@ -0,0 +1,26 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import fields, models
+
+
+class StockAvailableCacheVersion(models.Model):
+
+    """ Version of the stock of each product, increased when it changes.
+    The values of the shared cache of the quantities available to promise
+    are only used while the versions they were computed with are current.
+    The version of the product 0 is increased when all the products change.
+    """
+    _name = 'stock.available.cache.version'
+    _description = 'Version of the stock of a product'
+    _log_access = False
+
+    # Not a Many2one: 0 stands for all the products
+    product_id = fields.Integer(
+        string='Product ID', required=True, readonly=True)
+    version = fields.Integer(readonly=True)
+
+    _sql_constraints = [
+        ('product_uniq', 'unique(product_id)',
+         'The stock of a product has a single version.'),
+    ]
@@ -0,0 +1,164 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from collections import defaultdict
+
+from odoo import api, fields, models, tools
+from odoo.addons import decimal_precision as dp
+
+from .product_product import MOVE_TODO_STATES
+
+UNIT = dp.get_precision('Product Unit of Measure')
+
+
+class StockAvailableSnapshot(models.Model):
+
+    """ Materialized stock quantities per product, location and company.
+    When enabled in the settings, the quantities available to promise are
+    read from this table instead of being computed from the quants and moves.
+    It is kept up to date when quants and moves are written, by adding the
+    difference between their new and old quantities to the rows they count
+    in.
+    The quants are summed up per location, and the pending moves per source
+    and destination location, so that the moves between two locations of the
+    same warehouse are left out of its incoming and outgoing quantities, like
+    with the moves themselves.
+    """
+    _name = 'stock.available.snapshot'
+    _description = 'Stock available to promise snapshot'
+    _log_access = False
+
+    product_id = fields.Many2one(
+        'product.product', string='Product',
+        required=True, index=True, readonly=True, ondelete='cascade')
+    location_id = fields.Many2one(
+        'stock.location', string='Location',
+        required=True, index=True, readonly=True, ondelete='cascade',
+        auto_join=True,
+        help="Location of the quants, or source location of the moves")
+    location_dest_id = fields.Many2one(
+        'stock.location', string='Destination Location',
+        index=True, readonly=True, ondelete='cascade', auto_join=True,
+        help="Destination location of the moves, empty for the quants")
+    company_id = fields.Many2one(
+        'res.company', string='Company',
+        index=True, readonly=True, ondelete='cascade')
+    qty_available = fields.Float(
+        string='Quantity On Hand', digits=UNIT, readonly=True)
+    product_qty = fields.Float(
+        string='Quantity Moved', digits=UNIT, readonly=True,
+        help="Quantity of the pending moves")
+
+    @api.model_cr
+    def init(self):
+        # One row per key, the quants having no destination location
+        tools.create_unique_index(
+            self._cr, 'stock_available_snapshot_key_uniq', self._table, [
+                'product_id', 'location_id', 'COALESCE(location_dest_id, 0)',
+                'COALESCE(company_id, 0)'])
+
+    @api.model
+    def _is_enabled(self):
+        return bool(self.env['ir.config_parameter'].sudo().get_param(
+            'stock_available_use_snapshot'))
+
+    @api.model
+    def _is_usable(self):
+        """ The snapshot only holds the current quantities of whole
+        locations, so it can't answer questions about lots, owners, packages
+        or dates.
+        """
+        if not self._is_enabled():
+            return False
+        return not any(self.env.context.get(key) is not None for key in (
+            'lot_id', 'owner_id', 'package_id', 'from_date', 'to_date'))
+
+    @api.model
+    def rebuild(self):
+        """ Rebuild the whole snapshot from the quants and moves """
+        self.env.cr.execute("DELETE FROM stock_available_snapshot")
+        self.env.cr.execute("""
+            INSERT INTO stock_available_snapshot (
+                product_id, location_id, location_dest_id, company_id,
+                qty_available, product_qty)
+            SELECT product_id, location_id, NULL, company_id,
+                SUM(quantity), 0.0
+            FROM stock_quant
+            GROUP BY product_id, location_id, company_id
+            UNION ALL
+            SELECT product_id, location_id, location_dest_id, company_id,
+                0.0, SUM(product_qty)
+            FROM stock_move
+            WHERE state IN %s
+            GROUP BY product_id, location_id, location_dest_id, company_id
+        """, (MOVE_TODO_STATES,))
+        self.invalidate_cache()
+        return True
+
+    @api.model
+    def _read_rows(self, records):
+        """ Read from the database what quants or moves count in the
+        snapshot, if enabled
+        :param records: stock.quant or stock.move recordset
+        :return: list of tuples (product_id, location_id, location_dest_id,
+                 company_id, qty_available, product_qty)
+        """
+        if not records or not self._is_enabled():
+            return []
+        if records._name == 'stock.quant':
+            self.env.cr.execute("""
+                SELECT product_id, location_id, NULL, company_id,
+                    quantity, 0.0
+                FROM stock_quant
+                WHERE id IN %s
+            """, (tuple(records.ids),))
+        else:
+            self.env.cr.execute("""
+                SELECT product_id, location_id, location_dest_id, company_id,
+                    0.0, product_qty
+                FROM stock_move
+                WHERE id IN %s AND state IN %s
+            """, (tuple(records.ids), MOVE_TODO_STATES))
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _update_rows(self, old_rows, records):
+        """ Add to the snapshot the difference between what quants or moves
+        count in it now and what they counted before being changed, if
+        enabled. Only the rows of the keys changed are locked.
+        :param old_rows: list of tuples, see _read_rows
+        :param records: stock.quant or stock.move recordset, as they are now
+        """
+        if not self._is_enabled():
+            return
+        deltas = defaultdict(lambda: [0.0, 0.0])
+        for rows, sign in ((old_rows, -1.0), (self._read_rows(records), 1.0)):
+            for row in rows:
+                delta = deltas[row[:4]]
+                delta[0] += sign * (row[4] or 0.0)
+                delta[1] += sign * (row[5] or 0.0)
+        values = [
+            key + tuple(delta) for key, delta in sorted(
+                deltas.items(), key=lambda item: tuple(
+                    value or 0 for value in item[0]))
+            if any(delta)]
+        if not values:
+            return
+        # pylint: disable=sql-injection
+        self.env.cr.execute("""
+            INSERT INTO stock_available_snapshot (
+                product_id, location_id, location_dest_id, company_id,
+                qty_available, product_qty)
+            VALUES {values}
+            ON CONFLICT (product_id, location_id,
+                         COALESCE(location_dest_id, 0),
+                         COALESCE(company_id, 0))
+            DO UPDATE SET
+                qty_available = stock_available_snapshot.qty_available
+                    + EXCLUDED.qty_available,
+                product_qty = stock_available_snapshot.product_qty
+                    + EXCLUDED.product_qty
+        """.format(values=", ".join(
+            ["(%s, %s, %s, %s, %s, %s)"] * len(values))),
+            [value for row in values for value in row])
+        self.invalidate_cache()
@@ -0,0 +1,58 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+SNAPSHOT_FIELDS = {
+    'product_id', 'location_id', 'location_dest_id', 'company_id', 'state',
+    'product_uom_qty', 'product_uom', 'product_qty',
+}
+CACHE_FIELDS = SNAPSHOT_FIELDS | {'date', 'restrict_partner_id'}
+
+
+class StockMove(models.Model):
+    _inherit = 'stock.move'
+
+    @api.model
+    def create(self, vals):
+        move = super(StockMove, self).create(vals)
+        self.env['stock.available.cache'].invalidate(move.product_id.ids)
+        return move
+
+    @api.multi
+    def write(self, vals):
+        if not CACHE_FIELDS.intersection(vals):
+            return super(StockMove, self).write(vals)
+        products = self.mapped('product_id')
+        res = super(StockMove, self).write(vals)
+        products |= self.mapped('product_id')
+        self.env['stock.available.cache'].invalidate(products.ids)
+        return res
+
+    # The snapshot is updated from the low-level methods, which also store
+    # the fields recomputed
+    @api.model
+    def _create(self, data_list):
+        records = super(StockMove, self)._create(data_list)
+        self.env['stock.available.snapshot']._update_rows([], records)
+        return records
+
+    @api.multi
+    def _write(self, vals):
+        if not SNAPSHOT_FIELDS.intersection(vals):
+            return super(StockMove, self)._write(vals)
+        snapshot = self.env['stock.available.snapshot']
+        old_rows = snapshot._read_rows(self)
+        res = super(StockMove, self)._write(vals)
+        snapshot._update_rows(old_rows, self)
+        return res
+
+    @api.multi
+    def unlink(self):
+        snapshot = self.env['stock.available.snapshot']
+        old_rows = snapshot._read_rows(self)
+        products = self.mapped('product_id')
+        res = super(StockMove, self).unlink()
+        self.env['stock.available.cache'].invalidate(products.ids)
+        snapshot._update_rows(old_rows, self.browse())
+        return res
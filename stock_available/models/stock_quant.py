@@ -0,0 +1,57 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+SNAPSHOT_FIELDS = {'product_id', 'location_id', 'company_id', 'quantity'}
+CACHE_FIELDS = SNAPSHOT_FIELDS | {
+    'lot_id', 'package_id', 'owner_id', 'reserved_quantity',
+}
+
+
+class StockQuant(models.Model):
+    _inherit = 'stock.quant'
+
+    @api.model
+    def create(self, vals):
+        quant = super(StockQuant, self).create(vals)
+        self.env['stock.available.cache'].invalidate(quant.product_id.ids)
+        return quant
+
+    @api.multi
+    def write(self, vals):
+        if not CACHE_FIELDS.intersection(vals):
+            return super(StockQuant, self).write(vals)
+        products = self.mapped('product_id')
+        res = super(StockQuant, self).write(vals)
+        products |= self.mapped('product_id')
+        self.env['stock.available.cache'].invalidate(products.ids)
+        return res
+
+    # The snapshot is updated from the low-level methods, which also store
+    # the fields recomputed
+    @api.model
+    def _create(self, data_list):
+        records = super(StockQuant, self)._create(data_list)
+        self.env['stock.available.snapshot']._update_rows([], records)
+        return records
+
+    @api.multi
+    def _write(self, vals):
+        if not SNAPSHOT_FIELDS.intersection(vals):
+            return super(StockQuant, self)._write(vals)
+        snapshot = self.env['stock.available.snapshot']
+        old_rows = snapshot._read_rows(self)
+        res = super(StockQuant, self)._write(vals)
+        snapshot._update_rows(old_rows, self)
+        return res
+
+    @api.multi
+    def unlink(self):
+        snapshot = self.env['stock.available.snapshot']
+        old_rows = snapshot._read_rows(self)
+        products = self.mapped('product_id')
+        res = super(StockQuant, self).unlink()
+        self.env['stock.available.cache'].invalidate(products.ids)
+        snapshot._update_rows(old_rows, self.browse())
+        return res
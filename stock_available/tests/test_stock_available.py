@@ -2,6 +2,11 @@
 # Copyright 2016 Sodexis
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.exceptions import UserError
 from odoo.tests.common import TransactionCase
 
 
@@ -139,3 +144,352 @@ class TestStockLogisticsWarehouse(TransactionCase):
         # Potential Qty is set as 0.0 by default
         self.assertEquals(templateAB.potential_qty, 0.0)
         self.assertEquals(productA.potential_qty, 0.0)
+
+    def test02_search_immediately_usable_qty(self):
+        """checking the SQL search on immediately_usable_qty, with products
+           without any stock and with a location in the context"""
+        productObj = self.env['product.product']
+        stock_location = self.env.ref('stock.stock_location_stock')
+        shelf_location = self.env.ref('stock.stock_location_components')
+        product = productObj.create({
+            'name': 'product without stock',
+            'type': 'product',
+        })
+
+        def search(operator, value, model=productObj):
+            return model.search([
+                ('id', '=', model == productObj and product.id or
+                 product.product_tmpl_id.id),
+                ('immediately_usable_qty', operator, value),
+            ])
+
+        self.assertTrue(search('=', 0))
+        self.assertTrue(search('<', 1))
+        self.assertFalse(search('>', 0))
+        self.assertTrue(search('=', 0, self.env['product.template']))
+        self.assertFalse(search('!=', 0, self.env['product.template']))
+
+        self.env['stock.quant']._update_available_quantity(
+            product, shelf_location, 5.0)
+        self.assertFalse(search('=', 0))
+        self.assertTrue(search('>', 4.5))
+        self.assertTrue(search('=', 5, self.env['product.template']))
+
+        other_location = self.env['stock.location'].create({
+            'name': 'Other',
+            'usage': 'internal',
+            'location_id': stock_location.location_id.id,
+        })
+        self.assertTrue(search(
+            '=', 0, productObj.with_context(location=other_location.id)))
+        self.assertTrue(search(
+            '=', 5, productObj.with_context(location=stock_location.id)))
+
+        # Rounded to the unit of measure of the product, as computed
+        uom_pack = self.env['uom.uom'].create({
+            'name': 'Pack',
+            'category_id': self.env.ref('uom.product_uom_categ_unit').id,
+            'uom_type': 'bigger',
+            'factor_inv': 1.0,
+            'rounding': 1.0,
+        })
+        product.write({'uom_id': uom_pack.id, 'uom_po_id': uom_pack.id})
+        self.env['stock.quant']._update_available_quantity(
+            product, shelf_location, 0.4)
+        product.invalidate_cache()
+        self.assertEqual(product.immediately_usable_qty, 5.0)
+        self.assertTrue(search('=', 5))
+        self.assertFalse(search('>', 5))
+
+        with self.assertRaises(UserError):
+            search('like', 0)
+        with self.assertRaises(UserError):
+            search('=', 'a')
+
+    def test03_snapshot(self):
+        """checking that the snapshot is kept up to date and gives the same
+           quantities as the quants and moves"""
+        productObj = self.env['product.product']
+        supplier_location = self.env.ref('stock.stock_location_suppliers')
+        stock_location = self.env.ref('stock.stock_location_stock')
+        customer_location = self.env.ref('stock.stock_location_customers')
+        product = productObj.create({
+            'name': 'product snapshot',
+            'type': 'product',
+        })
+        self.env['stock.quant']._update_available_quantity(
+            product, stock_location, 10.0)
+
+        settings = self.env['res.config.settings'].create({})
+        settings.stock_available_use_snapshot = True
+        settings.set_values()
+        snapshot = self.env['stock.available.snapshot']
+        self.assertTrue(snapshot._is_usable())
+        self.assertTrue(snapshot.search([('product_id', '=', product.id)]))
+
+        def check_quantities(value):
+            product.invalidate_cache()
+            self.assertEqual(product.immediately_usable_qty, value)
+            self.assertEqual(
+                product.product_tmpl_id.immediately_usable_qty, value)
+            self.assertEqual(
+                productObj.search([
+                    ('id', '=', product.id),
+                    ('immediately_usable_qty', '=', value)]),
+                product)
+            # The same without snapshot
+            product.invalidate_cache()
+            self.assertEqual(
+                product.with_context(
+                    lot_id=False).immediately_usable_qty, value)
+
+        check_quantities(10)
+        move_in = self.env['stock.move'].create({
+            'location_id': supplier_location.id,
+            'location_dest_id': stock_location.id,
+            'name': 'MOVE INCOMING -> STOCK',
+            'product_id': product.id,
+            'product_uom': product.uom_id.id,
+            'product_uom_qty': 4,
+        })
+        move_out = self.env['stock.move'].create({
+            'location_id': stock_location.id,
+            'location_dest_id': customer_location.id,
+            'name': 'MOVE STOCK -> CUSTOMER',
+            'product_id': product.id,
+            'product_uom': product.uom_id.id,
+            'product_uom_qty': 3,
+        })
+        check_quantities(10)
+        (move_in | move_out)._action_confirm()
+        check_quantities(11)
+        move_out._action_assign()
+        move_out.move_line_ids.write({'qty_done': 3.0})
+        move_out._action_done()
+        check_quantities(11)
+        product.invalidate_cache()
+        self.assertEqual(
+            product.with_context(
+                location=customer_location.id).immediately_usable_qty, 3)
+        move_in._action_cancel()
+        check_quantities(7)
+
+        def snapshot_rows():
+            snapshot.invalidate_cache()
+            return {
+                (row.location_id, row.location_dest_id, row.company_id): (
+                    row.qty_available, row.product_qty)
+                for row in snapshot.search([('product_id', '=', product.id)])
+                if row.qty_available or row.product_qty}
+
+        # The differences added up give the same rows as a rebuild
+        rows = snapshot_rows()
+        snapshot.rebuild()
+        self.assertEqual(snapshot_rows(), rows)
+        check_quantities(7)
+
+    def test04_available_quantities_matrix(self):
+        """checking the matrix of quantities per product and location
+           against the quantities computed for each location"""
+        productObj = self.env['product.product']
+        stock_location = self.env.ref('stock.stock_location_stock')
+        shelf_location = self.env.ref('stock.stock_location_components')
+        customer_location = self.env.ref('stock.stock_location_customers')
+        products = productObj.create({
+            'name': 'product matrix A',
+            'type': 'product',
+        }) | productObj.create({
+            'name': 'product matrix B',
+            'type': 'product',
+        })
+        self.env['stock.quant']._update_available_quantity(
+            products[0], shelf_location, 5.0)
+        self.env['stock.quant']._update_available_quantity(
+            products[1], stock_location, 8.0)
+        moves = self.env['stock.move'].create({
+            'location_id': shelf_location.id,
+            'location_dest_id': stock_location.id,
+            'name': 'MOVE SHELF -> STOCK',
+            'product_id': products[0].id,
+            'product_uom': products[0].uom_id.id,
+            'product_uom_qty': 2,
+        }) | self.env['stock.move'].create({
+            'location_id': stock_location.id,
+            'location_dest_id': customer_location.id,
+            'name': 'MOVE STOCK -> CUSTOMER',
+            'product_id': products[1].id,
+            'product_uom': products[1].uom_id.id,
+            'product_uom_qty': 3,
+        })
+        moves._action_confirm()
+
+        locations = stock_location | shelf_location | customer_location
+        matrix = productObj.get_available_quantities_matrix(
+            products.ids, locations.ids)
+        self.assertEqual(len(matrix), 6)
+        for row in matrix:
+            product = productObj.browse(row['product_id'])
+            product.invalidate_cache()
+            expected = product.with_context(
+                location=row['location_id']).immediately_usable_qty
+            self.assertEqual(row['immediately_usable_qty'], expected)
+            self.assertEqual(row['potential_qty'], 0.0)
+        quantities = {
+            (row['product_id'], row['location_id']):
+            row['immediately_usable_qty'] for row in matrix}
+        self.assertEqual(quantities[products[0].id, stock_location.id], 5)
+        self.assertEqual(quantities[products[0].id, shelf_location.id], 3)
+        self.assertEqual(quantities[products[1].id, stock_location.id], 5)
+        self.assertEqual(quantities[products[1].id, customer_location.id], 3)
+
+    def test05_available_quantities_forecast(self):
+        """checking the projected quantities against the quantities computed
+           with each date of the forecast"""
+        productObj = self.env['product.product']
+        supplier_location = self.env.ref('stock.stock_location_suppliers')
+        stock_location = self.env.ref('stock.stock_location_stock')
+        customer_location = self.env.ref('stock.stock_location_customers')
+        product = productObj.create({
+            'name': 'product forecast',
+            'type': 'product',
+        })
+        self.env['stock.quant']._update_available_quantity(
+            product, stock_location, 10.0)
+        now = fields.Datetime.now()
+        moves = self.env['stock.move']
+        for days, qty, location, location_dest in (
+                (-1, 1, stock_location, customer_location),
+                (2, 4, supplier_location, stock_location),
+                (5, 6, stock_location, customer_location),
+                (5, 3, supplier_location, stock_location),
+                (40, 7, stock_location, customer_location)):
+            moves |= self.env['stock.move'].create({
+                'location_id': location.id,
+                'location_dest_id': location_dest.id,
+                'name': 'MOVE',
+                'product_id': product.id,
+                'product_uom': product.uom_id.id,
+                'product_uom_qty': qty,
+                'date': now + timedelta(days=days),
+                'date_expected': now + timedelta(days=days),
+            })
+        moves._action_confirm()
+        # The confirmation may change the dates of the moves
+        for move, days in zip(moves, (-1, 2, 5, 5, 40)):
+            move.date = now + timedelta(days=days)
+
+        forecast = productObj.with_context(
+            location=stock_location.id).get_available_quantities_forecast(
+                product.ids, now + timedelta(days=30))
+        self.assertEqual(len(forecast), 1)
+        self.assertEqual(forecast[0]['product_id'], product.id)
+        points = forecast[0]['forecast']
+        self.assertEqual([qty for date, qty in points], [9, 13, 10])
+        for date, qty in points[1:]:
+            product.invalidate_cache()
+            self.assertEqual(product.with_context(
+                location=stock_location.id,
+                to_date=date).immediately_usable_qty, qty)
+
+    def test06_cache(self):
+        """checking the quantities are memoized until the stock changes"""
+        productObj = self.env['product.product']
+        cacheObj = self.env['stock.available.cache']
+        stock_location = self.env.ref('stock.stock_location_stock')
+        product = productObj.create({
+            'name': 'product cache',
+            'type': 'product',
+        })
+        self.env['stock.quant']._update_available_quantity(
+            product, stock_location, 10.0)
+
+        cacheObj.reset_stats()
+        res, _ = product._get_available_quantities_dict()
+        self.assertEqual(res[product.id]['immediately_usable_qty'], 10.0)
+        self.assertEqual(cacheObj.get_stats(), {'hits': 0, 'misses': 1})
+        product._get_available_quantities_dict()
+        self.assertEqual(cacheObj.get_stats(), {'hits': 1, 'misses': 1})
+        # Another context is another entry
+        product.with_context(
+            location=stock_location.id)._get_available_quantities_dict()
+        self.assertEqual(cacheObj.get_stats(), {'hits': 1, 'misses': 2})
+
+        # Changing the stock forgets the cached values
+        self.env['stock.quant']._update_available_quantity(
+            product, stock_location, 5.0)
+        res, _ = product._get_available_quantities_dict()
+        self.assertEqual(res[product.id]['immediately_usable_qty'], 15.0)
+        self.assertEqual(cacheObj.get_stats(), {'hits': 1, 'misses': 3})
+        product.invalidate_cache()
+        self.assertEqual(product.immediately_usable_qty, 15.0)
+        # Reserving forgets them too, for the modules based on it
+        stats = cacheObj.get_stats()
+        product._get_available_quantities_dict()
+        self.assertEqual(cacheObj.get_stats()['hits'], stats['hits'] + 1)
+        self.env['stock.quant'].search([
+            ('product_id', '=', product.id)]).write({'reserved_quantity': 1.0})
+        product._get_available_quantities_dict()
+        self.assertEqual(
+            cacheObj.get_stats()['misses'], stats['misses'] + 1)
+
+        # Same values with the cache shared by the worker
+        self.env['ir.config_parameter'].set_param(
+            'stock_available_cache_shared', '1')
+        res, _ = product._get_available_quantities_dict()
+        self.assertEqual(res[product.id]['immediately_usable_qty'], 15.0)
+        stats = cacheObj.get_stats()
+        res, _ = product._get_available_quantities_dict()
+        self.assertEqual(res[product.id]['immediately_usable_qty'], 15.0)
+        self.assertEqual(cacheObj.get_stats()['hits'], stats['hits'] + 1)
+        # Only the values of the products whose stock changes are forgotten
+        other_product = productObj.create({
+            'name': 'other product cache',
+            'type': 'product',
+        })
+        other_product._get_available_quantities_dict()
+        # The registry cache is left alone
+        with patch.object(
+                type(self.registry), '_clear_cache') as clear_cache:
+            self.env['stock.quant']._update_available_quantity(
+                product, stock_location, -3.0)
+            clear_cache.assert_not_called()
+        stats = cacheObj.get_stats()
+        other_product._get_available_quantities_dict()
+        self.assertEqual(cacheObj.get_stats()['hits'], stats['hits'] + 1)
+        res, _ = product._get_available_quantities_dict()
+        self.assertEqual(res[product.id]['immediately_usable_qty'], 12.0)
+        self.assertEqual(
+            cacheObj.get_stats()['misses'], stats['misses'] + 1)
+        self.env['ir.config_parameter'].set_param(
+            'stock_available_cache_shared', False)
+
+    def test07_template_quantities(self):
+        """checking the quantities of a template are the sum of the \
+           quantities of its active variants"""
+        productObj = self.env['product.product']
+        stock_location = self.env.ref('stock.stock_location_stock')
+        template = self.env['product.template'].create({
+            'name': 'template sum',
+            'type': 'product',
+        })
+        products = template.product_variant_ids
+        for name in ('variant 1', 'variant 2'):
+            products |= productObj.create({
+                'name': name,
+                'type': 'product',
+                'product_tmpl_id': template.id,
+            })
+        for qty, product in zip((1.0, 2.0, 4.0), products):
+            self.env['stock.quant']._update_available_quantity(
+                product, stock_location, qty)
+
+        template.invalidate_cache()
+        self.assertEqual(template.immediately_usable_qty, 7.0)
+        self.assertEqual(template.immediately_usable_qty, sum(
+            products.mapped('immediately_usable_qty')))
+        products[2].active = False
+        template.invalidate_cache()
+        self.assertEqual(template.immediately_usable_qty, 3.0)
+        self.assertEqual(
+            template._compute_available_quantities_dict()[template.id],
+            {'immediately_usable_qty': 3.0, 'potential_qty': 0.0})
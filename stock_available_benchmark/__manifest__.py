@@ -0,0 +1,19 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+{
+    'name': 'Benchmarks of the stock available to promise',
+    'summary': 'Measure the time and queries spent computing the stock '
+               'available to promise',
+    'version': '12.0.1.0.0',
+    'author': 'Omdatech, Odoo Community Association (OCA)',
+    'website': 'https://github.com/OCA/stock-logistics-warehouse',
+    'category': 'Hidden',
+    'depends': [
+        'stock_available_immediately',
+        'stock_available_mrp',
+        'stock_available_unreserved',
+        'stock_benchmark',
+    ],
+    'license': 'AGPL-3',
+    'installable': True,
+}
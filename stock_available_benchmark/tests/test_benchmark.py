@@ -0,0 +1,166 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import os
+
+from odoo.addons.stock_benchmark.tests.common import BenchmarkCase
+
+SIZES = {
+    'products': 40,
+    'variants': 4,
+    'locations': 5,
+    'moves': 80,
+    'bom_depth': 3,
+}
+
+
+class TestBenchmark(BenchmarkCase):
+
+    benchmark_prefix = 'STOCK_AVAILABLE_BENCHMARK'
+    benchmark_sizes = SIZES
+    benchmark_baseline_path = os.path.join(
+        os.path.dirname(__file__), 'query_counts.json')
+
+    @classmethod
+    def _generate_data(cls, products, variants, locations, moves, bom_depth):
+        """ Create a synthetic catalog and stock
+        :param products: int, number of products
+        :param variants: int, number of variants per template
+        :param locations: int, number of internal locations
+        :param moves: int, number of pending moves
+        :param bom_depth: int, depth of the BoMs
+        """
+        productObj = cls.env['product.product']
+        uom_unit = cls.env.ref('uom.product_uom_unit')
+        stock_location = cls.env.ref('stock.warehouse0').lot_stock_id
+        supplier_location = cls.env.ref('stock.stock_location_suppliers')
+        customer_location = cls.env.ref('stock.stock_location_customers')
+
+        cls.locations = cls.env['stock.location']
+        for index in range(locations):
+            cls.locations |= cls.env['stock.location'].create({
+                'name': 'Benchmark bin %d' % index,
+                'usage': 'internal',
+                'location_id': stock_location.id,
+            })
+
+        cls.templates = cls.env['product.template']
+        cls.products = productObj
+        for index in range(products):
+            if not index % variants:
+                template = cls.env['product.template'].create({
+                    'name': 'Benchmark template %d' % index,
+                    'type': 'product',
+                    'uom_id': uom_unit.id,
+                    'uom_po_id': uom_unit.id,
+                })
+                cls.templates |= template
+                cls.products |= template.product_variant_ids
+                continue
+            cls.products |= productObj.create({
+                'name': 'Benchmark variant %d' % index,
+                'type': 'product',
+                'product_tmpl_id': template.id,
+            })
+
+        for index, product in enumerate(cls.products):
+            cls.env['stock.quant']._update_available_quantity(
+                product, cls.locations[index % locations],
+                10.0 + index % 7)
+
+        stock_moves = cls.env['stock.move']
+        for index in range(moves):
+            product = cls.products[index % products]
+            location = cls.locations[index % locations]
+            if index % 2:
+                location_id, location_dest_id = location, customer_location
+            else:
+                location_id, location_dest_id = supplier_location, location
+            stock_moves |= cls.env['stock.move'].create({
+                'name': 'Benchmark move %d' % index,
+                'product_id': product.id,
+                'product_uom': product.uom_id.id,
+                'product_uom_qty': 1.0 + index % 5,
+                'location_id': location_id.id,
+                'location_dest_id': location_dest_id.id,
+            })
+        stock_moves._action_confirm()
+        stock_moves._action_assign()
+
+        # Chains of BoMs, each level made of the next one and of a raw
+        # material shared by all the BoMs
+        raw_material = cls.products[-1]
+        chains = min(products // 10, (products - 1) // (bom_depth + 1))
+        for chain in range(chains):
+            offset = chain * (bom_depth + 1)
+            for level in range(bom_depth):
+                product = cls.products[offset + level]
+                component = cls.products[offset + level + 1]
+                cls.env['mrp.bom'].create({
+                    'product_tmpl_id': product.product_tmpl_id.id,
+                    'product_id': product.id,
+                    'product_qty': 1.0,
+                    'type': 'normal',
+                    'bom_line_ids': [
+                        (0, 0, {'product_id': component.id,
+                                'product_qty': 2.0}),
+                        (0, 0, {'product_id': raw_material.id,
+                                'product_qty': 1.0}),
+                    ],
+                })
+
+    def _invalidate_caches(self):
+        self.env['stock.available.cache'].invalidate()
+        super()._invalidate_caches()
+
+    def _check_search(self, records, field, operation):
+        """ Measure the search of the records having a positive field and
+        check it matches the computed values
+        """
+        found = self._measure(operation, lambda: records.search([
+            ('id', 'in', records.ids),
+            (field, '>', 0.0),
+        ]))
+        self.assertEqual(
+            found, records.filtered(lambda record: record[field] > 0.0))
+
+    def test_compute_products(self):
+        self._measure('compute_products', lambda: self.products.mapped(
+            'immediately_usable_qty'))
+
+    def test_compute_products_potential(self):
+        self._measure(
+            'compute_products_potential',
+            lambda: self.products.mapped('potential_qty'))
+
+    def test_compute_templates(self):
+        self._measure('compute_templates', lambda: self.templates.mapped(
+            'immediately_usable_qty'))
+
+    def test_compute_products_unreserved(self):
+        self._measure(
+            'compute_products_unreserved',
+            lambda: self.products.mapped('qty_available_not_res'))
+
+    def test_compute_templates_unreserved(self):
+        self._measure(
+            'compute_templates_unreserved',
+            lambda: self.templates.mapped('qty_available_not_res'))
+
+    def test_search_products(self):
+        self._check_search(
+            self.products, 'immediately_usable_qty', 'search_products')
+
+    def test_search_templates(self):
+        self._check_search(
+            self.templates, 'immediately_usable_qty', 'search_templates')
+
+    def test_search_products_unreserved(self):
+        self._check_search(
+            self.products, 'qty_available_not_res',
+            'search_products_unreserved')
+
+    def test_search_templates_unreserved(self):
+        self._check_search(
+            self.templates, 'qty_available_not_res',
+            'search_templates_unreserved')
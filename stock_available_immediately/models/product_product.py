@@ -18,6 +18,23 @@ class ProductProduct(models.Model):
                 stock_dict[product.id]['incoming_qty']
         return res, stock_dict
 
+    @api.multi
+    def _compute_available_quantities_matrix(self, locations):
+        res, stock_matrix = super(
+            ProductProduct, self)._compute_available_quantities_matrix(
+                locations)
+        for product in self:
+            for location in locations:
+                res[product.id][location.id]['immediately_usable_qty'] -= \
+                    stock_matrix[product.id][location.id]['incoming_qty']
+        return res, stock_matrix
+
     @api.depends('virtual_available', 'incoming_qty')
     def _compute_available_quantities(self):
         return super(ProductProduct, self)._compute_available_quantities()
+
+    @api.model
+    def _get_immediately_usable_qty_terms(self):
+        terms = super(ProductProduct, self)._get_immediately_usable_qty_terms()
+        terms.pop('incoming_qty', None)
+        return terms
@@ -66,6 +66,13 @@ class TestStockLogisticsWarehouse(TransactionCase):
             # transactions
             product.refresh()
             self.assertEqual(product.immediately_usable_qty, value)
+            # Now check search function
+            results = self.env[product._name].search(
+                [('immediately_usable_qty', '=', value)])
+            self.assertIn(product.id, results.ids)
+            results = self.env[product._name].search(
+                [('immediately_usable_qty', '!=', value)])
+            self.assertNotIn(product.id, results.ids)
 
         compare_product_usable_qty(productA, 0)
         compare_product_usable_qty(templateAB, 0)
@@ -112,3 +119,51 @@ class TestStockLogisticsWarehouse(TransactionCase):
         # Potential Qty is set as 0.0 by default
         self.assertEquals(templateAB.potential_qty, 0.0)
         self.assertEquals(productA.potential_qty, 0.0)
+
+    def test02_snapshot_internal_move(self):
+        """
+        Checking that the snapshot leaves the moves inside the warehouse out
+        of the incoming and outgoing quantities, like the moves themselves.
+        """
+        productObj = self.env['product.product']
+        stock_location = self.env.ref('stock.stock_location_stock')
+        shelf_location = self.env.ref('stock.stock_location_components')
+        product = productObj.create({
+            'name': 'product snapshot',
+            'type': 'product',
+        })
+        self.env['stock.quant']._update_available_quantity(
+            product, stock_location, 10.0)
+        move = self.env['stock.move'].create({
+            'location_id': stock_location.id,
+            'location_dest_id': shelf_location.id,
+            'name': 'STOCK --> SHELF',
+            'product_id': product.id,
+            'product_uom': product.uom_id.id,
+            'product_uom_qty': 4,
+        })
+        move._action_confirm()
+
+        def get_quantities():
+            product.invalidate_cache()
+            return (
+                product.immediately_usable_qty,
+                product.incoming_qty,
+                product.outgoing_qty,
+                productObj.search([
+                    ('id', '=', product.id),
+                    ('immediately_usable_qty', '=', 10)]),
+            )
+
+        expected = get_quantities()
+        self.assertEqual(expected, (10, 0, 0, product))
+        settings = self.env['res.config.settings'].create({})
+        settings.stock_available_use_snapshot = True
+        settings.set_values()
+        self.assertTrue(
+            self.env['stock.available.snapshot']._is_usable())
+        self.assertEqual(get_quantities(), expected)
+        # Within the shelf alone, the move is incoming
+        product.invalidate_cache()
+        self.assertEqual(product.with_context(
+            location=shelf_location.id).immediately_usable_qty, 0)
@@ -2,7 +2,7 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 {
     'name': 'Consider the production potential is available to promise',
-    'version': '12.0.1.0.0',
+    'version': '12.0.1.1.0',
     "author": "Numérigraphe,"
               "Odoo Community Association (OCA)",
     'website': 'https://github.com/OCA/stock-logistics-warehouse',
@@ -11,6 +11,12 @@
         'stock_available',
         'mrp'
     ],
+    'data': [
+        'security/ir.model.access.csv',
+        'security/stock_available_mrp_security.xml',
+        'data/ir_cron.xml',
+        'views/stock_available_potential_views.xml',
+    ],
     'demo': [
         'demo/mrp_data.xml',
     ],
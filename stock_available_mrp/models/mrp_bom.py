@@ -0,0 +1,114 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, fields, models, tools
+
+
+class MrpBom(models.Model):
+    _inherit = 'mrp.bom'
+
+    explosion_version = fields.Integer(
+        readonly=True, copy=False,
+        help="Changed with the BoM, its lines and the BoMs of its "
+             "components, so that its cached explosions are left unused")
+
+    @api.model_cr
+    def init(self):
+        # Versions are never reused, even if the transaction is rolled back
+        self.env.cr.execute(
+            "CREATE SEQUENCE IF NOT EXISTS mrp_bom_explosion_version_seq")
+
+    @api.multi
+    def _get_made_products(self):
+        """ Products made with the BoMs
+        :return: product.product recordset
+        """
+        return self.mapped('product_id') | self.filtered(
+            lambda bom: not bom.product_id).mapped(
+                'product_tmpl_id.product_variant_ids')
+
+    @api.multi
+    def _clear_stock_available_caches(self, products=None):
+        """ Forget the BoMs of the products, the explosions of these BoMs and
+        of the BoMs using the products they make, and the potential
+        quantities of these products
+        :param products: product.product recordset, products made with
+                         BoMs which are gone
+        """
+        cache = self.env['stock.available.cache']
+        cache._get_transaction_cache('bom_ids').clear()
+        products = self._get_made_products() | (
+            products or self.env['product.product'])
+        product_ids = list(cache._get_invalidated_ids(products.ids))
+        self.env.cr.execute("""
+            UPDATE mrp_bom
+            SET explosion_version = nextval('mrp_bom_explosion_version_seq')
+            WHERE id IN %s OR id IN (
+                SELECT bom_id FROM mrp_bom_line
+                WHERE product_id = ANY(%s::integer[]))
+        """, (tuple(self.ids) or (None,), product_ids))
+        self.invalidate_cache(fnames=['explosion_version'])
+        cache.invalidate(product_ids)
+
+    @api.model
+    @tools.ormcache('self.env.uid', 'bom_id', 'product_id', 'version')
+    def _get_components_needs_cached(self, bom_id, product_id, version=0):
+        """ Explode a BoM down to its components, for the quantity of the
+        BoM. The result is kept until the version of the BoM changes.
+        :param bom_id: id of the BoM
+        :param product_id: id of the product to make
+        :param version: explosion_version of the BoM
+        :return: tuple of (component_id, qty)
+        """
+        product = self.env['product.product'].browse(product_id)
+        exploded_components = self.browse(bom_id).explode(product, 1.0)[1]
+        needs = product._get_components_needs(exploded_components)
+        return tuple(
+            (component.id, qty) for component, qty in needs.items())
+
+    @api.model
+    def create(self, vals):
+        bom = super(MrpBom, self).create(vals)
+        bom._clear_stock_available_caches()
+        return bom
+
+    @api.multi
+    def write(self, vals):
+        products = self._get_made_products()
+        res = super(MrpBom, self).write(vals)
+        self._clear_stock_available_caches(products)
+        return res
+
+    @api.multi
+    def unlink(self):
+        products = self._get_made_products()
+        res = super(MrpBom, self).unlink()
+        self.browse()._clear_stock_available_caches(products)
+        self.env['stock.available.potential']._refresh_made_with(products)
+        return res
+
+
+class MrpBomLine(models.Model):
+    _inherit = 'mrp.bom.line'
+
+    @api.model
+    def create(self, vals):
+        line = super(MrpBomLine, self).create(vals)
+        line.bom_id._clear_stock_available_caches()
+        return line
+
+    @api.multi
+    def write(self, vals):
+        boms = self.mapped('bom_id')
+        res = super(MrpBomLine, self).write(vals)
+        (boms | self.mapped('bom_id'))._clear_stock_available_caches()
+        return res
+
+    @api.multi
+    def unlink(self):
+        boms = self.mapped('bom_id')
+        products = boms._get_made_products()
+        res = super(MrpBomLine, self).unlink()
+        boms.exists()._clear_stock_available_caches()
+        self.env['stock.available.potential']._refresh_made_with(products)
+        return res
@@ -1,9 +1,19 @@
 # Copyright 2014 Numérigraphe SARL
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-from collections import Counter
-from odoo import api, fields, models
-from odoo.fields import first
+import logging
+from collections import Counter, defaultdict
+from odoo import api, fields, models, _
+from odoo.addons.stock.models.product import OPERATORS
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy
+except (ImportError, IOError) as err:
+    numpy = None
+    _logger.debug(err)
 
 
 class ProductProduct(models.Model):
@@ -15,6 +25,7 @@ class ProductProduct(models.Model):
         compute='_compute_bom_id',
         string='BOM'
     )
+    potential_qty = fields.Float(search='_search_potential_qty')
 
     @api.depends('virtual_available', 'bom_id', 'bom_id.product_qty')
     def _compute_available_quantities(self):
@@ -34,22 +45,93 @@ class ProductProduct(models.Model):
             ('product_tmpl_id', 'in', self.mapped('product_tmpl_id.id'))
         ]
 
+    @api.multi
+    def _get_bom_ids(self):
+        """ Find the BoM of each product: the first one, by sequence, among
+        the BoMs of the variant and the BoMs of its template without variant.
+        The BoMs are searched at once and indexed by product, and the results
+        are kept until the end of the transaction or the next change of BoM.
+        :return: dict {product_id: bom_id or False}
+        """
+        cache = self.env['stock.available.cache']._get_transaction_cache(
+            'bom_ids').setdefault(
+                (self.env.uid, self.env.user.company_id.id), {})
+        # New records can't have a BoM yet
+        missing = self.filtered(
+            lambda p: isinstance(p.id, int) and p.id not in cache)
+        if missing:
+            boms = self.env['mrp.bom'].search(
+                missing._get_bom_id_domain(),
+                order='sequence, product_id',
+            )
+            # {product_id or product_tmpl_id: (position, bom_id)}
+            variant_boms = {}
+            template_boms = {}
+            for position, bom in enumerate(boms):
+                if bom.product_id:
+                    variant_boms.setdefault(
+                        bom.product_id.id, (position, bom.id))
+                else:
+                    template_boms.setdefault(
+                        bom.product_tmpl_id.id, (position, bom.id))
+            for product in missing:
+                candidates = [
+                    candidate for candidate in (
+                        variant_boms.get(product.id),
+                        template_boms.get(product.product_tmpl_id.id))
+                    if candidate]
+                cache[product.id] = candidates and min(candidates)[1] or False
+        return {product.id: cache.get(product.id, False) for product in self}
+
     @api.multi
     @api.depends('product_tmpl_id')
     def _compute_bom_id(self):
-        bom_obj = self.env['mrp.bom']
-        boms = bom_obj.search(
-            self._get_bom_id_domain(),
-            order='sequence, product_id',
-        )
+        bom_ids = self._get_bom_ids()
         for product in self:
-            product_boms = boms.filtered(
-                lambda b: b.product_id == product or
-                (not b.product_id and
-                 b.product_tmpl_id == product.product_tmpl_id)
-            )
-            if product_boms:
-                product.bom_id = first(product_boms)
+            product.bom_id = bom_ids[product.id]
+
+    @api.model
+    def _search_potential_qty(self, operator, value):
+        """ Search the stored potential quantities if they are materialized,
+        otherwise compute the potential of every product having a BoM.
+        :param operator: str
+        :param value: float
+        :return: list of tuple (domain)
+        """
+        if operator not in OPERATORS:
+            raise UserError(_('Invalid domain operator %s') % operator)
+        if not isinstance(value, (float, int)):
+            raise UserError(_('Invalid domain right operand %s') % value)
+        potential_obj = self.env['stock.available.potential']
+        if potential_obj._is_enabled():
+            ids, negate = potential_obj._search_potential_qty(operator, value)
+            return [('id', negate and 'not in' or 'in', ids)]
+        products = self.search([('product_tmpl_id.bom_ids', '!=', False)])
+        ids = [
+            product.id for product in products
+            if OPERATORS[operator](product.potential_qty, value)]
+        if OPERATORS[operator](0.0, value):
+            # The products without BoM can't be made
+            return ['|', ('id', 'in', ids), ('id', 'not in', products.ids)]
+        return [('id', 'in', ids)]
+
+    @api.model
+    def _get_immediately_usable_qty_python_products(self, domain=None):
+        """ The potential quantity of the products with a BoM can't be
+        computed in SQL
+        """
+        products = super(
+            ProductProduct, self)._get_immediately_usable_qty_python_products(
+                domain)
+        return products | self.search(list(domain or []) + [
+            ('product_tmpl_id.bom_ids', '!=', False),
+        ])
+
+    @api.model
+    def _get_available_quantities_cache_key(self):
+        key = super(ProductProduct, self)._get_available_quantities_cache_key()
+        return key + (self.env['ir.config_parameter'].sudo().get_param(
+            'stock_available_mrp_based_on', 'qty_available'),)
 
     @api.multi
     def _compute_available_quantities_dict(self):
@@ -66,21 +148,30 @@ class ProductProduct(models.Model):
         )
 
         # explode all boms at once
-        exploded_boms = product_with_bom._explode_boms()
+        components_needs = product_with_bom._get_bom_components_needs()
 
         # extract the list of product used as bom component
         component_products = self.env['product.product'].browse()
-        for exploded_components in exploded_boms.values():
-            for bom_component in exploded_components:
-                component_products |= first(bom_component).product_id
+        for component_needs in components_needs.values():
+            component_products |= self.browse(
+                [component.id for component in component_needs])
 
         # Compute stock for product components.
         # {'productid': {field_name: qty}}
         if res and stock_available_mrp_based_on in list(res.values())[0]:
             # If the qty is computed by the same method use it to avoid
             # stressing the cache
+            if not self._context.get('stock_available_mrp_bottom_up'):
+                # Compute the sub-assemblies once each, from the bottom up,
+                # so that each level finds its components in the cache
+                for level in product_with_bom._get_bom_levels():
+                    level.with_context(
+                        stock_available_mrp_bottom_up=True,
+                    )._get_available_quantities_dict()
             component_qties, _ = \
-                component_products._compute_available_quantities_dict()
+                component_products.with_context(
+                    stock_available_mrp_bottom_up=True,
+                )._get_available_quantities_dict()
         else:
             # The qty is a field computed by an other method than the
             # current one. Take the value on the record.
@@ -90,40 +181,275 @@ class ProductProduct(models.Model):
                         stock_available_mrp_based_on]} for p in
                 component_products}
 
+        potential_qties = product_with_bom._compute_potential_qties(
+            components_needs, component_qties, stock_available_mrp_based_on)
         for product in product_with_bom:
-            # Need by product (same product can be in many BOM lines/levels)
-            exploded_components = exploded_boms[product.id]
-            component_needs = product._get_components_needs(
-                exploded_components)
-            if not component_needs:
-                # The BoM has no line we can use
-                potential_qty = 0.0
-
-            else:
-                # Find the lowest quantity we can make with the stock at hand
-                components_potential_qty = min(
-                    [component_qties[component.id][
-                        stock_available_mrp_based_on] / need
-                     for component, need in component_needs.items()]
-                )
-
-                bom_id = product.bom_id
-                potential_qty = (bom_id.product_qty * components_potential_qty)
-                potential_qty = potential_qty > 0.0 and potential_qty or 0.0
-
-                # We want to respect the rounding factor of the potential_qty
-                # Rounding down as we want to be pesimistic.
-                potential_qty = bom_id.product_uom_id._compute_quantity(
-                    potential_qty,
-                    product.bom_id.product_tmpl_id.uom_id,
-                    rounding_method='DOWN'
-                )
-
+            potential_qty = potential_qties[product.id]
             res[product.id]['potential_qty'] = potential_qty
             res[product.id]['immediately_usable_qty'] += potential_qty
 
         return res, stock_dict
 
+    @api.multi
+    def _get_bom_levels(self):
+        """ Order the sub-assemblies of the products topologically: each
+        level is only made of components of the lower levels, and of
+        components without BoM.
+        :return: list of product.product recordsets, from the bottom up,
+                 without the products themselves unless they are
+                 sub-assemblies of one another
+        :raise: UserError if the BoMs make a cycle
+        """
+        # {product_id: set of the ids of its components having a BoM}
+        sub_assemblies = {}
+        to_explode = self.filtered('bom_id')
+        while to_explode:
+            components_needs = to_explode._get_bom_components_needs()
+            next_to_explode = self.browse()
+            for product in to_explode:
+                components = self.browse([
+                    component.id
+                    for component in components_needs[product.id]
+                ]).filtered('bom_id')
+                sub_assemblies[product.id] = set(components.ids)
+                next_to_explode |= components
+            to_explode = next_to_explode.filtered(
+                lambda p: p.id not in sub_assemblies)
+
+        # Kahn's algorithm, keeping the longest path to the bottom
+        parents = defaultdict(list)
+        pending = {}
+        for product_id, component_ids in sub_assemblies.items():
+            pending[product_id] = len(component_ids)
+            for component_id in component_ids:
+                parents[component_id].append(product_id)
+        product_levels = {
+            product_id: 0
+            for product_id, count in pending.items() if not count}
+        to_visit = list(product_levels)
+        while to_visit:
+            component_id = to_visit.pop()
+            for product_id in parents[component_id]:
+                product_levels[product_id] = max(
+                    product_levels.get(product_id, 0),
+                    product_levels[component_id] + 1)
+                pending[product_id] -= 1
+                if not pending[product_id]:
+                    to_visit.append(product_id)
+        cycle_ids = [
+            product_id for product_id, count in pending.items() if count]
+        if cycle_ids:
+            raise UserError(_(
+                "The bills of materials of the following products make a "
+                "cycle: %s") % ", ".join(
+                    self.browse(cycle_ids).mapped('display_name')))
+
+        all_component_ids = set().union(*sub_assemblies.values())
+        levels = defaultdict(list)
+        for product_id, level in product_levels.items():
+            if product_id in all_component_ids:
+                levels[level].append(product_id)
+        return [self.browse(levels[level]) for level in sorted(levels)]
+
+    @api.multi
+    def _compute_potential_qties(self, components_needs, component_qties,
+                                 based_on):
+        """ Compute the potential quantities of several products at once.
+        When NumPy is available, the ratios of stock to needs of all the
+        products are computed as arrays, otherwise each product goes through
+        _get_potential_qty.
+        :param components_needs: dict {product_id: collections.Counter
+                                 {component: need}}
+        :param component_qties: dict {component_id: {based_on: qty}}
+        :param based_on: str, the quantity of the components to use
+        :return: dict {product_id: potential_qty}
+        """
+        if numpy is None:
+            return {
+                product.id: product._get_potential_qty(
+                    components_needs[product.id], component_qties, based_on)
+                for product in self}
+        # The products without needs are worth 0 and the conversions between
+        # categories must fail as in _get_potential_qty
+        products = self.filtered(
+            lambda p: components_needs[p.id] and
+            p.bom_id.product_uom_id.category_id ==
+            p.bom_id.product_tmpl_id.uom_id.category_id)
+        res = {
+            product.id: product._get_potential_qty(
+                components_needs[product.id], component_qties, based_on)
+            for product in self - products}
+        if not products:
+            return res
+
+        # Sparse matrix of the needs: one (row, column, need) triplet per
+        # product and component, sorted by product
+        component_columns = {}
+        rows, columns, needs = [], [], []
+        for row, product in enumerate(products):
+            for component, need in components_needs[product.id].items():
+                rows.append(row)
+                columns.append(component_columns.setdefault(
+                    component.id, len(component_columns)))
+                needs.append(need)
+        stock = numpy.zeros(len(component_columns))
+        for component_id, column in component_columns.items():
+            stock[column] = component_qties[component_id][based_on]
+        rows = numpy.array(rows)
+        ratios = stock[numpy.array(columns)] / numpy.array(needs)
+        # Find the lowest quantity we can make with the stock at hand
+        starts = numpy.flatnonzero(numpy.r_[True, rows[1:] != rows[:-1]])
+        components_potential_qties = numpy.minimum.reduceat(ratios, starts)
+
+        bom_qties = numpy.empty(len(products))
+        from_factors = numpy.ones(len(products))
+        to_factors = numpy.ones(len(products))
+        roundings = numpy.empty(len(products))
+        for row, product in enumerate(products):
+            bom_id = product.bom_id
+            from_uom = bom_id.product_uom_id
+            to_uom = bom_id.product_tmpl_id.uom_id
+            bom_qties[row] = bom_id.product_qty
+            if from_uom != to_uom:
+                from_factors[row] = from_uom.factor
+                to_factors[row] = to_uom.factor
+            roundings[row] = to_uom.rounding
+        potential_qties = numpy.clip(
+            bom_qties * components_potential_qties, 0.0, None)
+        potential_qties = potential_qties / from_factors * to_factors
+        # Round down as float_round does, with the same tolerance
+        normalized_qties = potential_qties / roundings
+        potential_qties = numpy.floor(
+            normalized_qties * (1.0 + 2.0 ** -52)) * roundings
+        for row, product in enumerate(products):
+            res[product.id] = float(potential_qties[row])
+        return res
+
+    @api.multi
+    def _get_potential_qty(self, component_needs, component_qties,
+                           based_on):
+        """ Compute the quantity of the product which can be made with the
+        given stock of its components
+        :param component_needs: collections.Counter {component: need}
+        :param component_qties: dict {component_id: {based_on: qty}}
+        :param based_on: str, the quantity of the components to use
+        :rtype: float
+        """
+        self.ensure_one()
+        if not component_needs:
+            # The BoM has no line we can use
+            return 0.0
+
+        # Find the lowest quantity we can make with the stock at hand
+        components_potential_qty = min(
+            [component_qties[component.id][based_on] / need
+             for component, need in component_needs.items()]
+        )
+
+        bom_id = self.bom_id
+        potential_qty = (bom_id.product_qty * components_potential_qty)
+        potential_qty = potential_qty > 0.0 and potential_qty or 0.0
+
+        # We want to respect the rounding factor of the potential_qty
+        # Rounding down as we want to be pesimistic.
+        return bom_id.product_uom_id._compute_quantity(
+            potential_qty,
+            bom_id.product_tmpl_id.uom_id,
+            rounding_method='DOWN'
+        )
+
+    @api.multi
+    def _compute_available_quantities_matrix(self, locations):
+        res, stock_matrix = super(
+            ProductProduct, self)._compute_available_quantities_matrix(
+                locations)
+        product_with_bom = self.filtered('bom_id')
+        if not product_with_bom or not locations:
+            return res, stock_matrix
+        stock_available_mrp_based_on = self.env[
+            'ir.config_parameter'].sudo().get_param(
+                'stock_available_mrp_based_on', 'qty_available')
+
+        components_needs = product_with_bom._get_bom_components_needs()
+        component_products = self.env['product.product'].browse()
+        for component_needs in components_needs.values():
+            component_products |= self.browse(
+                [component.id for component in component_needs])
+
+        # {component_id: {location_id: {field_name: qty}}}
+        if stock_available_mrp_based_on in \
+                res[self[:1].id][locations[:1].id]:
+            component_matrix, _ = \
+                component_products._compute_available_quantities_matrix(
+                    locations)
+        elif stock_available_mrp_based_on in \
+                stock_matrix[self[:1].id][locations[:1].id]:
+            # A stock quantity: no need to go down the sub-assemblies
+            component_matrix = component_products._compute_quantities_matrix(
+                locations)
+        else:
+            # The qty is a field computed by an other method than the
+            # current one. Take the value on the record in each location.
+            component_matrix = {p.id: {} for p in component_products}
+            for location in locations:
+                components = component_products.with_context(
+                    location=location.id)
+                components.invalidate_cache(
+                    fnames=[stock_available_mrp_based_on],
+                    ids=components.ids)
+                for component in components:
+                    component_matrix[component.id][location.id] = {
+                        stock_available_mrp_based_on: component[
+                            stock_available_mrp_based_on]}
+
+        for location in locations:
+            component_qties = {
+                component_id: component_res[location.id]
+                for component_id, component_res
+                in component_matrix.items()}
+            potential_qties = product_with_bom._compute_potential_qties(
+                components_needs, component_qties,
+                stock_available_mrp_based_on)
+            for product in product_with_bom:
+                potential_qty = potential_qties[product.id]
+                product_res = res[product.id][location.id]
+                product_res['potential_qty'] = potential_qty
+                product_res['immediately_usable_qty'] += potential_qty
+        return res, stock_matrix
+
+    @api.multi
+    def _compute_available_quantities_forecast(self, date_to):
+        res = super(
+            ProductProduct, self)._compute_available_quantities_forecast(
+                date_to)
+        product_with_bom = self.filtered('bom_id')
+        if product_with_bom:
+            # The potential is made of the current stock of the components
+            available, _ = \
+                product_with_bom._get_available_quantities_dict()
+            for product in product_with_bom:
+                potential_qty = available[product.id]['potential_qty']
+                res[product.id] = [
+                    (date, qty + potential_qty)
+                    for date, qty in res[product.id]]
+        return res
+
+    @api.multi
+    def _get_bom_components_needs(self):
+        """ Needs of components of the products, from the cached explosions
+        of their BoMs
+        :return: dict {product_id: collections.Counter {component: need}}
+        """
+        bom_obj = self.env['mrp.bom']
+        res = {}
+        for product in self:
+            res[product.id] = Counter({
+                self.browse(component_id): qty
+                for component_id, qty in bom_obj._get_components_needs_cached(
+                    product.bom_id.id, product.id,
+                    product.bom_id.explosion_version)})
+        return res
+
     @api.multi
     def _explode_boms(self):
         """
@@ -0,0 +1,38 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, fields, models, _
+from odoo.addons.stock.models.product import OPERATORS
+from odoo.exceptions import UserError
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    potential_qty = fields.Float(search='_search_potential_qty')
+
+    @api.model
+    def _search_potential_qty(self, operator, value):
+        """ Search the stored potential quantities if they are materialized,
+        otherwise compute the potential of every template having a BoM.
+        :param operator: str
+        :param value: float
+        :return: list of tuple (domain)
+        """
+        if operator not in OPERATORS:
+            raise UserError(_('Invalid domain operator %s') % operator)
+        if not isinstance(value, (float, int)):
+            raise UserError(_('Invalid domain right operand %s') % value)
+        potential_obj = self.env['stock.available.potential']
+        if potential_obj._is_enabled():
+            ids, negate = potential_obj._search_potential_qty(
+                operator, value, groupby='product_tmpl_id')
+            return [('id', negate and 'not in' or 'in', ids)]
+        templates = self.search([('bom_ids', '!=', False)])
+        ids = [
+            template.id for template in templates
+            if OPERATORS[operator](template.potential_qty, value)]
+        if OPERATORS[operator](0.0, value):
+            # The templates without BoM can't be made
+            return ['|', ('id', 'in', ids), ('id', 'not in', templates.ids)]
+        return [('id', 'in', ids)]
@@ -0,0 +1,33 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+
+class StockAvailableCache(models.AbstractModel):
+    _inherit = 'stock.available.cache'
+
+    @api.model
+    def _get_invalidated_ids(self, ids):
+        """ The potential quantity of a product depends on the stock of the
+        components of its BoMs, down to the last level
+        """
+        ids = super(StockAvailableCache, self)._get_invalidated_ids(ids)
+        if not ids:
+            return ids
+        self.env.cr.execute("""
+            WITH RECURSIVE made(product_id) AS (
+                SELECT unnest(%s::integer[])
+                UNION
+                SELECT product.id
+                FROM made
+                JOIN mrp_bom_line line ON line.product_id = made.product_id
+                JOIN mrp_bom bom ON bom.id = line.bom_id
+                JOIN product_product product
+                    ON product.id = bom.product_id
+                    OR (bom.product_id IS NULL
+                        AND product.product_tmpl_id = bom.product_tmpl_id)
+            )
+            SELECT product_id FROM made
+        """, (list(ids),))
+        return {product_id for product_id, in self.env.cr.fetchall()}
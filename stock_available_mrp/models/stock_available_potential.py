@@ -0,0 +1,210 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import logging
+
+from odoo import api, fields, models
+from odoo.addons import decimal_precision as dp
+from odoo.addons.stock.models.product import OPERATORS
+
+_logger = logging.getLogger(__name__)
+
+WATERMARK_PARAM = 'stock_available_mrp_potential_watermark'
+
+
+class StockAvailablePotential(models.Model):
+
+    """ Materialized potential quantities per product and company.
+    When the stock_available_mrp_materialize_potential system parameter is
+    set, a scheduled action stores the potential quantity of the products
+    having a BoM, so that they can be searched, sorted and exported without
+    exploding the BoMs. Each run only refreshes the products whose
+    components' stock or BoMs changed since the previous one.
+    """
+    _name = 'stock.available.potential'
+    _description = 'Materialized potential quantity'
+    _order = 'product_id, company_id'
+    _log_access = False
+
+    product_id = fields.Many2one(
+        'product.product', string='Product',
+        required=True, index=True, readonly=True, ondelete='cascade')
+    product_tmpl_id = fields.Many2one(
+        'product.template', string='Product Template',
+        required=True, index=True, readonly=True, ondelete='cascade')
+    company_id = fields.Many2one(
+        'res.company', string='Company',
+        required=True, index=True, readonly=True, ondelete='cascade')
+    potential_qty = fields.Float(
+        string='Potential', readonly=True,
+        digits=dp.get_precision('Product Unit of Measure'))
+    date = fields.Datetime(string='Computed on', readonly=True)
+
+    _sql_constraints = [
+        ('product_company_uniq', 'unique(product_id, company_id)',
+         'The potential quantity is stored once per product and company.'),
+    ]
+
+    @api.model
+    def _is_enabled(self):
+        return bool(self.env['ir.config_parameter'].sudo().get_param(
+            'stock_available_mrp_materialize_potential'))
+
+    @api.model
+    def _get_changed_products(self, since):
+        """ Find the products whose potential may have changed from a date:
+        the products whose stock or BoMs changed, and recursively the
+        products made with them.
+        :param since: datetime
+        :return: product.product recordset
+        """
+        cr = self.env.cr
+        cr.execute("""
+            SELECT product_id FROM stock_quant WHERE write_date >= %(since)s
+            UNION
+            SELECT product_id FROM stock_move WHERE write_date >= %(since)s
+            UNION
+            SELECT product.id
+            FROM mrp_bom bom
+            JOIN product_product product
+                ON product.product_tmpl_id = bom.product_tmpl_id
+                AND (bom.product_id IS NULL OR bom.product_id = product.id)
+            WHERE bom.write_date >= %(since)s
+            OR EXISTS (
+                SELECT 1 FROM mrp_bom_line line
+                WHERE line.bom_id = bom.id AND line.write_date >= %(since)s)
+        """, {'since': since})
+        product_ids = {row[0] for row in cr.fetchall()}
+        to_visit = set(product_ids)
+        while to_visit:
+            cr.execute("""
+                SELECT DISTINCT product.id
+                FROM mrp_bom_line line
+                JOIN mrp_bom bom ON bom.id = line.bom_id
+                JOIN product_product product
+                    ON product.product_tmpl_id = bom.product_tmpl_id
+                    AND (bom.product_id IS NULL
+                         OR bom.product_id = product.id)
+                WHERE line.product_id IN %s
+            """, (tuple(to_visit),))
+            to_visit = {row[0] for row in cr.fetchall()} - product_ids
+            product_ids |= to_visit
+        return self.env['product.product'].browse(product_ids)
+
+    @api.model
+    def _refresh(self, products):
+        """ Store the potential quantities of some products, for each
+        company, computed with the warehouses of the company
+        :param products: product.product recordset
+        """
+        products = products.sudo().with_context(active_test=False)
+        # The products whose BoMs are gone lose their stored potential
+        self.env.cr.execute("""
+            DELETE FROM stock_available_potential
+            WHERE product_id IN %s
+        """, (tuple(products.ids) or (None,),))
+        products = products.filtered('bom_id')
+        now = fields.Datetime.now()
+        for company in self.env['res.company'].sudo().search([]):
+            warehouses = self.env['stock.warehouse'].sudo().search([
+                ('company_id', '=', company.id),
+            ])
+            if not warehouses or not products:
+                continue
+            company_products = products.with_context(
+                warehouse=warehouses.ids, force_company=company.id)
+            res, _ = company_products._get_available_quantities_dict()
+            rows = [
+                (product.id, product.product_tmpl_id.id, company.id,
+                 res[product.id]['potential_qty'], now)
+                for product in company_products]
+            self.env.cr.executemany("""
+                INSERT INTO stock_available_potential (
+                    product_id, product_tmpl_id, company_id, potential_qty,
+                    date)
+                VALUES (%s, %s, %s, %s, %s)
+            """, rows)
+        self.invalidate_cache()
+
+    @api.model
+    def _refresh_made_with(self, products):
+        """ Refresh now, if enabled, the stored potential of some products
+        and of the products made with them, for the changes which leave no
+        date for the scheduled action to find, such as deleted BoMs
+        :param products: product.product recordset
+        """
+        if not products or not self._is_enabled():
+            return
+        product_ids = self.env['stock.available.cache']._get_invalidated_ids(
+            products.ids)
+        self._refresh(self.env['product.product'].browse(product_ids))
+
+    @api.model
+    def rebuild(self):
+        """ Recompute the potential quantities of all the products """
+        self.env.cr.execute("DELETE FROM stock_available_potential")
+        self._refresh(self.env['product.product'].with_context(
+            active_test=False).search([
+                ('product_tmpl_id.bom_ids', '!=', False),
+            ]))
+
+    @api.model
+    def cron_refresh(self):
+        """ Refresh the potential quantities which may have changed since
+        the previous run, or all of them on the first run
+        """
+        if not self._is_enabled():
+            return
+        icp = self.env['ir.config_parameter'].sudo()
+        # The write dates are the start of the transactions: the next run
+        # must look back to the start of the oldest transaction still
+        # running, which may commit after this run, however long it takes
+        self.env.cr.execute("""
+            SELECT MIN(xact_start) AT TIME ZONE 'UTC'
+            FROM pg_stat_activity
+            WHERE datname = current_database()
+            AND xact_start IS NOT NULL
+        """)
+        next_watermark = self.env.cr.fetchone()[0]
+        watermark = icp.get_param(WATERMARK_PARAM)
+        if watermark:
+            products = self._get_changed_products(
+                fields.Datetime.to_datetime(watermark))
+            _logger.info(
+                "Refreshing the potential quantity of %d products",
+                len(products))
+            self._refresh(products)
+        else:
+            _logger.info("Computing the potential quantity of all products")
+            self.rebuild()
+        icp.set_param(
+            WATERMARK_PARAM, fields.Datetime.to_string(next_watermark))
+
+    @api.model
+    def _search_potential_qty(self, operator, value, groupby='product_id'):
+        """ Compare the stored potential quantities of the company of the
+        user to a value. The products without a stored potential are worth
+        0: when 0 matches, the groups which do NOT match are returned
+        instead.
+        :param operator: str, one of OPERATORS
+        :param value: float
+        :param groupby: 'product_id' or 'product_tmpl_id' (the potential of
+                        a template being the biggest of its variants)
+        :return: tuple (list of ids, whether the ids don't match)
+        """
+        negate = OPERATORS[operator](0.0, value)
+        company_id = self._context.get(
+            'force_company', self.env.user.company_id.id)
+        # pylint: disable=sql-injection
+        self.env.cr.execute("""
+            SELECT {groupby}
+            FROM stock_available_potential
+            WHERE company_id = %s
+            GROUP BY {groupby}
+            HAVING {negate}(MAX(potential_qty) {operator} %s)
+        """.format(
+            groupby=groupby,
+            negate=negate and "NOT " or "",
+            operator=operator,
+        ), (company_id, value))
+        return [row[0] for row in self.env.cr.fetchall()], negate
@@ -1,7 +1,10 @@
 # Copyright 2014 Numérigraphe SARL
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+from unittest.mock import patch
+
 from odoo.tests.common import TransactionCase
+from odoo.exceptions import UserError
 from odoo.osv.expression import TRUE_LEAF
 
 
@@ -465,3 +468,208 @@ class TestPotentialQty(TransactionCase):
             {p1.id: 3.0, p2.id: 3.0, p3.id: 0.0},
             {p.id: p.potential_qty for p in products}
         )
+
+    def test_search_immediately_usable_qty(self):
+        p1 = self.product_model.create({'name': 'Test P1'})
+        p2 = self.product_model.create({'name': 'Test P2', 'type': 'product'})
+        self.create_simple_bom(p1, p2, sub_product_qty=2)
+        self.create_inventory(p2.id, 6)
+
+        def search(model, record, operator, value):
+            return model.search([
+                ('id', '=', record.id),
+                ('immediately_usable_qty', operator, value),
+            ])
+
+        self.assertTrue(search(self.product_model, p1, '=', 3))
+        self.assertFalse(search(self.product_model, p1, '=', 0))
+        self.assertTrue(search(self.product_model, p2, '=', 6))
+        template_model = self.env['product.template']
+        self.assertTrue(search(template_model, p1.product_tmpl_id, '>', 2))
+        self.assertTrue(search(template_model, p1.product_tmpl_id, '!=', 0))
+
+    def test_bom_explosion_cache(self):
+        p1 = self.product_model.create({'name': 'Test P1'})
+        p2 = self.product_model.create({'name': 'Test P2', 'type': 'product'})
+        bom = self.create_simple_bom(p1, p2, sub_product_qty=2)
+        self.create_inventory(p2.id, 6)
+
+        self.assertEqual(
+            {p1.id: {p2: 2.0}}, p1._get_bom_components_needs())
+        self.assertEqual(3.0, p1.potential_qty)
+
+        # Changing the BoM forgets the explosion, and only that
+        with patch.object(self.registry, '_clear_cache') as clear_cache:
+            bom.bom_line_ids.product_qty = 3
+        clear_cache.assert_not_called()
+        self.assertEqual(
+            {p1.id: {p2: 3.0}}, p1._get_bom_components_needs())
+        p1.refresh()
+        self.assertEqual(2.0, p1.potential_qty)
+
+    def test_bom_id(self):
+        p1 = self.product_model.create({'name': 'Test P1'})
+        p2 = self.product_model.create({'name': 'Test P2', 'type': 'product'})
+        template_bom = self.bom_model.create({
+            'product_tmpl_id': p1.product_tmpl_id.id,
+            'product_qty': 1,
+            'sequence': 5,
+        })
+        variant_bom = self.create_simple_bom(p1, p2)
+        variant_bom.sequence = 10
+
+        # The first BoM by sequence wins, be it of the variant or template
+        p1.invalidate_cache()
+        self.assertEqual(template_bom, p1.bom_id)
+        variant_bom.sequence = 1
+        p1.invalidate_cache()
+        self.assertEqual(variant_bom, p1.bom_id)
+        self.assertEqual(
+            {p1.id: variant_bom.id, p2.id: False},
+            (p1 | p2)._get_bom_ids())
+
+    def test_compute_potential_qties(self):
+        uom_dozen = self.env.ref('uom.product_uom_dozen')
+        p1 = self.product_model.create({'name': 'Test P1'})
+        p2 = self.product_model.create({'name': 'Test P2', 'type': 'product'})
+        p3 = self.product_model.create({'name': 'Test P3'})
+        bom = self.create_simple_bom(p1, p2, sub_product_qty=2)
+        bom.product_uom_id = uom_dozen
+        self.create_simple_bom(p3, p2, product_qty=3, sub_product_qty=4)
+        self.create_inventory(p2.id, 25)
+
+        products = p1 | p3
+        components_needs = products._get_bom_components_needs()
+        component_qties = {p2.id: {'qty_available': 25.0}}
+        # 12.5 dozens, 18.75 rounded down
+        expected = {p1.id: 150.0, p3.id: 18.0}
+        self.assertEqual(expected, {
+            product.id: product._get_potential_qty(
+                components_needs[product.id], component_qties,
+                'qty_available')
+            for product in products})
+        self.assertEqual(expected, products._compute_potential_qties(
+            components_needs, component_qties, 'qty_available'))
+
+    def test_bom_levels(self):
+        self.config.set_param('stock_available_mrp_based_on',
+                              'immediately_usable_qty')
+        p1 = self.product_model.create({'name': 'Test P1'})
+        p2 = self.product_model.create({'name': 'Test P2'})
+        p3 = self.product_model.create({'name': 'Test P3'})
+        p4 = self.product_model.create({'name': 'Test P4', 'type': 'product'})
+        self.create_simple_bom(p1, p2, sub_product_qty=2)
+        self.create_simple_bom(p2, p3, sub_product_qty=2)
+        self.create_simple_bom(p3, p4, sub_product_qty=2)
+        self.create_inventory(p4.id, 8)
+
+        self.assertEqual([p3, p2], p1._get_bom_levels())
+        self.assertEqual([p3], (p2 | p3)._get_bom_levels())
+        self.product_model.invalidate_cache()
+        self.assertEqual(
+            {p1.id: 1.0, p2.id: 2.0, p3.id: 4.0, p4.id: 0.0},
+            {p.id: p.potential_qty for p in p1 | p2 | p3 | p4})
+
+        # P4 needs P1: the BoMs make a cycle
+        self.create_simple_bom(p4, p1)
+        with self.assertRaises(UserError):
+            p1._get_bom_levels()
+
+    def test_materialized_potential_qty(self):
+        potential_model = self.env['stock.available.potential']
+        p1 = self.product_model.create({'name': 'Test P1'})
+        p2 = self.product_model.create({'name': 'Test P2', 'type': 'product'})
+        self.create_simple_bom(p1, p2, sub_product_qty=2)
+        self.create_inventory(p2.id, 6)
+
+        def search(model, operator, value):
+            return model.search([
+                ('id', 'in', (p1 | p2).ids),
+                ('potential_qty', operator, value),
+            ])
+
+        # Computed on the fly until materialized
+        self.assertEqual(p1, search(self.product_model, '>', 2))
+        self.assertEqual(p2, search(self.product_model, '=', 0))
+
+        self.config.set_param(
+            'stock_available_mrp_materialize_potential', '1')
+        potential_model.cron_refresh()
+        potential = potential_model.search([
+            ('product_id', '=', p1.id),
+            ('company_id', '=', self.env.user.company_id.id),
+        ])
+        self.assertEqual(3.0, potential.potential_qty)
+        self.assertEqual(p1, search(self.product_model, '>', 2))
+        self.assertEqual(p2, search(self.product_model, '=', 0))
+        self.assertEqual(
+            p1.product_tmpl_id,
+            self.env['product.template'].search([
+                ('id', 'in', (p1 | p2).product_tmpl_id.ids),
+                ('potential_qty', '=', 3),
+            ]))
+
+        # Only refreshed by the next run
+        self.create_inventory(p2.id, 10)
+        self.assertEqual(p1, search(self.product_model, '=', 3))
+        potential_model.cron_refresh()
+        self.assertEqual(p1, search(self.product_model, '=', 5))
+
+        # Deleting a line leaves no date to find, the potential is
+        # refreshed at once
+        bom = p1.product_tmpl_id.bom_ids
+        p3 = self.product_model.create({'name': 'Test P3', 'type': 'product'})
+        bom.write({'bom_line_ids': [(0, 0, {
+            'product_id': p3.id, 'product_qty': 1.0})]})
+        potential_model.cron_refresh()
+        self.assertEqual(p1 | p2, search(self.product_model, '=', 0))
+        bom.bom_line_ids.filtered(lambda line: line.product_id == p3).unlink()
+        self.assertEqual(p1, search(self.product_model, '=', 5))
+
+        # The products without a BoM anymore lose their stored potential
+        p1.product_tmpl_id.bom_ids.write({'active': False})
+        potential_model._refresh(p1)
+        self.assertFalse(
+            potential_model.search([('product_id', '=', p1.id)]))
+
+    def test_available_quantities_matrix(self):
+        p1 = self.product_model.create({'name': 'Test P1'})
+        p2 = self.product_model.create({'name': 'Test P2', 'type': 'product'})
+        self.create_simple_bom(p1, p2, sub_product_qty=2)
+        main_stock = self.wh_main.lot_stock_id
+        shop_stock = self.wh_ch.lot_stock_id
+        self.create_inventory(p2.id, 6, main_stock.id)
+        self.create_inventory(p2.id, 10, shop_stock.id)
+        locations = main_stock | shop_stock
+
+        # Based on qty_available by default, without computing the
+        # components in each location on their own
+        product_class = type(self.product_model)
+        with patch.object(
+                product_class, '_compute_quantities_dict', autospec=True,
+                side_effect=product_class._compute_quantities_dict,
+        ) as compute_quantities_dict:
+            res, _ = (p1 | p2)._compute_available_quantities_matrix(
+                locations)
+        compute_quantities_dict.assert_not_called()
+        self.assertEqual(3.0, res[p1.id][main_stock.id]['potential_qty'])
+        self.assertEqual(5.0, res[p1.id][shop_stock.id]['potential_qty'])
+        for location in locations:
+            self.assertEqual(
+                p1.with_context(location=location.id).potential_qty,
+                res[p1.id][location.id]['potential_qty'])
+
+    def test_python_products(self):
+        p1 = self.product_model.create({'name': 'Test P1'})
+        p2 = self.product_model.create({'name': 'Test P2', 'type': 'product'})
+        p3 = self.product_model.create({'name': 'Test P3'})
+        self.create_simple_bom(p1, p2)
+        self.create_simple_bom(p3, p2)
+
+        # Only the products with a BoM within the domain
+        self.assertEqual(
+            p1, self.product_model._get_immediately_usable_qty_python_products(
+                [('product_tmpl_id', 'in', (p1 | p2).product_tmpl_id.ids)]))
+        self.assertLessEqual(
+            p1 | p3,
+            self.product_model._get_immediately_usable_qty_python_products())
@@ -34,15 +34,12 @@ class ProductTemplate(models.Model):
 
     @api.multi
     def action_open_quants_unreserved(self):
-        products_ids = self.mapped('product_variant_ids').ids
-        quants = self.env['stock.quant'].search([
-            ('product_id', 'in', products_ids),
+        products = self.env['product.product'].search([
+            ('id', 'in', self.mapped('product_variant_ids').ids),
+            ('qty_available_not_res', '>', 0),
         ])
-        quant_ids = quants.filtered(
-            lambda x: x.product_id.qty_available_not_res > 0
-        ).ids
         result = self.env.ref('stock.product_open_quants').read()[0]
-        result['domain'] = [('id', 'in', quant_ids)]
+        result['domain'] = [('product_id', 'in', products.ids)]
         result['context'] = {
             'search_default_locationgroup': 1,
             'search_default_internal_loc': 1,
@@ -50,9 +47,26 @@ class ProductTemplate(models.Model):
         return result
 
     def _search_quantity_unreserved(self, operator, value):
-        domain = [('qty_available_not_res', operator, value)]
-        product_variant_ids = self.env['product.product'].search(domain)
-        return [('product_variant_ids', 'in', product_variant_ids.ids)]
+        """ Find the templates having a variant matching the condition,
+        as the searches on the stock quantities of the core do.
+        """
+        products = self.env['product.product']
+        products._check_quantity_unreserved_operands(operator, value)
+        query, params = products._get_quantity_unreserved_query()
+        # The variants without any quant have 0 unreserved
+        join = OPERATORS[operator](0.0, value) and "LEFT JOIN" or "JOIN"
+        precision = self.env['decimal.precision'].precision_get(
+            'Product Unit of Measure')
+        query = """
+            SELECT DISTINCT product.product_tmpl_id
+            FROM product_product product
+            {join} ({query}) AS quant ON quant.product_id = product.id
+            WHERE product.active
+            AND ROUND(COALESCE(quant.qty, 0.0)::numeric, %s) {operator} %s
+        """.format(join=join, query=query, operator=operator)
+        # pylint: disable=sql-injection
+        self.env.cr.execute(query, params + [precision, value])
+        return [('id', 'in', [row[0] for row in self.env.cr.fetchall()])]
 
 
 class ProductProduct(models.Model):
@@ -75,26 +89,34 @@ class ProductProduct(models.Model):
         return domain_quant
 
     @api.multi
-    def _compute_product_available_not_res_dict(self):
-
-        res = {}
-
+    def _compute_product_available_not_res_by_location(self):
+        """ Compute the unreserved quantities per product and location
+        :return: dict {product_id: {location_id: qty}}, without the
+                 locations having no quants, not rounded
+        """
         domain_quant = self._prepare_domain_available_not_reserved()
         quants = self.env['stock.quant'].with_context(lang=False).read_group(
             domain_quant,
             ['product_id', 'location_id', 'quantity', 'reserved_quantity'],
             ['product_id', 'location_id'],
             lazy=False)
-        product_sums = {}
+        res = {}
         for quant in quants:
-            # create a dictionary with the total value per products
-            product_sums.setdefault(quant['product_id'][0], 0.)
-            product_sums[quant['product_id'][0]] += (
-                quant['quantity'] - quant['reserved_quantity']
-            )
+            product_res = res.setdefault(quant['product_id'][0], {})
+            location_id = quant['location_id'][0]
+            product_res[location_id] = product_res.get(location_id, 0.0) + (
+                quant['quantity'] - quant['reserved_quantity'])
+        return res
+
+    @api.multi
+    def _compute_product_available_not_res_dict(self):
+
+        res = {}
+
+        by_location = self._compute_product_available_not_res_by_location()
         for product in self.with_context(prefetch_fields=False, lang=''):
             available_not_res = float_round(
-                product_sums.get(product.id, 0.0),
+                sum(by_location.get(product.id, {}).values()),
                 precision_rounding=product.uom_id.rounding
             )
             res[product.id] = {
@@ -102,6 +124,29 @@ class ProductProduct(models.Model):
             }
         return res
 
+    @api.model
+    def get_available_not_res_by_location(self, product_ids):
+        """ Get the unreserved quantities of some products per location,
+        honouring the location context like qty_available_not_res.
+        :param product_ids: list of product ids
+        :return: list of dicts with the keys product_id, location_id and
+                 qty_available_not_res, only for the locations having quants
+        """
+        products = self.browse(product_ids)
+        by_location = products._compute_product_available_not_res_by_location()
+        res = []
+        for product in products.with_context(prefetch_fields=False):
+            rounding = product.uom_id.rounding
+            for location_id, qty in sorted(
+                    by_location.get(product.id, {}).items()):
+                res.append({
+                    'product_id': product.id,
+                    'location_id': location_id,
+                    'qty_available_not_res': float_round(
+                        qty, precision_rounding=rounding),
+                })
+        return res
+
     @api.multi
     @api.depends('stock_move_ids.product_qty', 'stock_move_ids.state')
     def _compute_qty_available_not_reserved(self):
@@ -111,14 +156,61 @@ class ProductProduct(models.Model):
             prod.qty_available_not_res = qty
         return res
 
-    def _search_quantity_unreserved(self, operator, value):
+    @api.model
+    def _check_quantity_unreserved_operands(self, operator, value):
         if operator not in OPERATORS:
             raise UserError(_('Invalid domain operator %s') % operator)
         if not isinstance(value, (float, int)):
             raise UserError(_('Invalid domain right operand %s') % value)
 
-        ids = []
-        for product in self.search([]):
-            if OPERATORS[operator](product.qty_available_not_res, value):
-                ids.append(product.id)
+    @api.model
+    def _get_quantity_unreserved_query(self):
+        """ Build the SQL equivalent of _compute_product_available_not_res_dict
+        for all the products at once, honouring the same location context.
+        :return: tuple (query, params), selecting (product_id, qty) rows,
+                 only for the products having quants
+        """
+        quant_obj = self.env['stock.quant']
+        query = quant_obj._where_calc(
+            list(self._get_domain_locations()[0]))
+        quant_obj._apply_ir_rules(query, 'read')
+        from_clause, where_clause, params = query.get_sql()
+        query = """
+            SELECT "stock_quant"."product_id",
+                   SUM("stock_quant"."quantity" -
+                       "stock_quant"."reserved_quantity") AS qty
+            FROM {from_clause}
+            {where}
+            GROUP BY "stock_quant"."product_id"
+        """.format(
+            from_clause=from_clause,
+            where=where_clause and "WHERE %s" % where_clause or "",
+        )
+        return query, params
+
+    def _search_quantity_unreserved(self, operator, value):
+        """ Compare the unreserved quantities in SQL. Only the products
+        having quants are evaluated: when the products without quants
+        (hence 0 unreserved) match, the ones which do NOT match are excluded
+        instead.
+        """
+        self._check_quantity_unreserved_operands(operator, value)
+        query, params = self._get_quantity_unreserved_query()
+        negate = OPERATORS[operator](0.0, value)
+        precision = self.env['decimal.precision'].precision_get(
+            'Product Unit of Measure')
+        query = """
+            SELECT quant.product_id
+            FROM ({query}) AS quant
+            WHERE {negate}(ROUND(quant.qty::numeric, %s) {operator} %s)
+        """.format(
+            query=query,
+            negate=negate and "NOT " or "",
+            operator=operator,
+        )
+        # pylint: disable=sql-injection
+        self.env.cr.execute(query, params + [precision, value])
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        if negate:
+            return [('id', 'not in', ids)]
         return [('id', 'in', ids)]
@@ -177,6 +177,33 @@ class TestStockLogisticsWarehouse(SavepointCase):
              'product_id': self.productA.id,
              'quantity': 60.0})
         self.compare_qty_available_not_res(self.productA, 80)
+        # The searches honour the location of the context
+        self.check_variants_found_correctly('=', 80, self.productA)
+        productObj = self.productObj.with_context(location=self.bin_b.id)
+        variants = self.templateAB.product_variant_ids
+        self.check_found_correctly(
+            productObj, [('id', 'in', variants.ids)], '=', 60, self.productA)
+        self.check_found_correctly(
+            productObj, [('id', '=', self.productA.id)], '=', 80,
+            self.productObj)
+        templateObj = self.templateObj.with_context(location=self.bin_b.id)
+        self.check_found_correctly(
+            templateObj, [('id', 'in', self.templateAB.ids)], '>', 59,
+            self.templateAB)
+
+        by_location = self.productObj.get_available_not_res_by_location(
+            self.templateAB.product_variant_ids.ids)
+        self.assertEqual(
+            sorted((line['product_id'], line['location_id'],
+                    line['qty_available_not_res']) for line in by_location),
+            sorted([(self.productA.id, self.stock_location.id, 10.0),
+                    (self.productA.id, self.bin_a.id, 10.0),
+                    (self.productA.id, self.bin_b.id, 60.0)]))
+        action = self.templateAB.action_open_quants_unreserved()
+        self.assertEqual(
+            self.env['stock.quant'].search(action['domain']),
+            self.env['stock.quant'].search([
+                ('product_id', '=', self.productA.id)]))
 
     def check_variants_found_correctly(self, operator, value, expected):
         domain = [('id', 'in', self.templateAB.product_variant_ids.ids)]
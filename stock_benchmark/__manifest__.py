@@ -0,0 +1,15 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+{
+    'name': 'Stock Benchmark Base',
+    'summary': 'Common harness of the benchmarks of the stock modules',
+    'version': '12.0.1.0.0',
+    'author': 'Omdatech, Odoo Community Association (OCA)',
+    'website': 'https://github.com/OCA/stock-logistics-warehouse',
+    'category': 'Hidden',
+    'depends': [
+        'stock',
+    ],
+    'license': 'AGPL-3',
+    'installable': True,
+}
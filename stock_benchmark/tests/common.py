@@ -0,0 +1,94 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import json
+import logging
+import os
+import time
+
+from odoo.tests.common import SavepointCase
+
+_logger = logging.getLogger(__name__)
+
+
+class BenchmarkCase(SavepointCase):
+    """ Generate synthetic data once for the class, then measure the wall
+    time and query count of operations against a recorded baseline """
+
+    # Prefix of the environment variables setting the sizes
+    benchmark_prefix = None
+    # Default size of each kind of generated data
+    benchmark_sizes = {}
+    # Path of the JSON file recording the query counts
+    benchmark_baseline_path = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sizes = {
+            key: int(os.environ.get(
+                '%s_%s' % (cls.benchmark_prefix, key.upper()), default))
+            for key, default in cls.benchmark_sizes.items()}
+        cls.record = bool(
+            os.environ.get('%s_RECORD' % cls.benchmark_prefix))
+        cls.baseline = {}
+        if os.path.exists(cls.benchmark_baseline_path):
+            with open(cls.benchmark_baseline_path) as baseline_file:
+                baseline = json.load(baseline_file)
+            # The counts depend on the size of the data
+            if baseline.get('sizes') == cls.sizes:
+                cls.baseline = baseline.get('query_counts', {})
+        cls.measures = {}
+        cls._generate_data(**cls.sizes)
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.record:
+            with open(cls.benchmark_baseline_path, 'w') as baseline_file:
+                json.dump({
+                    'sizes': cls.sizes,
+                    'query_counts': dict(cls.baseline, **cls.measures),
+                }, baseline_file, indent=4, sort_keys=True)
+                baseline_file.write('\n')
+        super().tearDownClass()
+
+    @classmethod
+    def _generate_data(cls, **sizes):
+        """ Create the synthetic data measured by the tests
+        :param sizes: int, size of each kind of data, by key of
+                      benchmark_sizes
+        """
+
+    def _invalidate_caches(self):
+        """ Empty the caches before measuring an operation """
+        self.env.invalidate_all()
+
+    def _measure(self, operation, function):
+        """ Run an operation with empty caches, log its wall time and query
+        count, and check the query count against the baseline
+        :param operation: str, key of the operation in the baseline
+        :param function: callable running the operation
+        :return: the result of function
+        """
+        self._invalidate_caches()
+        queries = self.cr.sql_log_count
+        start = time.time()
+        result = function()
+        duration = time.time() - start
+        queries = self.cr.sql_log_count - queries
+        _logger.info(
+            "%s: %d queries, %.3fs (%s)", operation, queries, duration,
+            ", ".join("%s=%d" % item for item in sorted(self.sizes.items())))
+        self.measures[operation] = queries
+        if self.record:
+            return result
+        if operation not in self.baseline:
+            _logger.warning(
+                "No baseline for %s, record it with %s_RECORD=1",
+                operation, self.benchmark_prefix)
+        else:
+            self.assertLessEqual(
+                queries, self.baseline[operation],
+                "%s takes %d queries, more than the %d of the baseline" % (
+                    operation, queries, self.baseline[operation]))
+        return result
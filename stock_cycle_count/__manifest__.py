@@ -5,7 +5,7 @@
     "name": "Stock Cycle Count",
     "summary": "Adds the capability to schedule cycle counts in a "
                "warehouse through different rules defined by the user.",
-    "version": "12.0.1.0.1",
+    "version": "12.0.1.2.1",
     "development_status": "Mature",
     "maintainers": ["lreficent"],
     "author": "Eficent, "
@@ -16,6 +16,7 @@
         "stock_account",
         "stock_inventory_discrepancy",
         "stock_inventory_exclude_sublocation",
+        "stock_location_warehouse_cache",
     ],
     "data": [
         "views/stock_cycle_count_view.xml",
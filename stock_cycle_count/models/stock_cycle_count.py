@@ -81,11 +81,21 @@ class StockCycleCount(models.Model):
             'exclude_sublocation': True
         }
 
-    @api.model
-    def create(self, vals):
-        vals['name'] = self.env['ir.sequence'].next_by_code(
-            'stock.cycle.count') or ''
-        return super(StockCycleCount, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            vals['name'] = self.env['ir.sequence'].next_by_code(
+                'stock.cycle.count') or ''
+        return super(StockCycleCount, self).create(vals_list)
+
+    @api.multi
+    def unlink(self):
+        # The planned counts removed are only noticed by a full planning
+        locations = self.filtered(
+            lambda cc: cc.state == 'draft').mapped('location_id')
+        res = super(StockCycleCount, self).unlink()
+        self.env['stock.warehouse']._reset_cycle_count_watermark(locations)
+        return res
 
     @api.multi
     def action_create_inventory_adjustment(self):
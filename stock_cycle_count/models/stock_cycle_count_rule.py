@@ -10,6 +10,9 @@ from datetime import timedelta, datetime
 class StockCycleCountRule(models.Model):
     _name = 'stock.cycle.count.rule'
     _description = "Stock Cycle Counts Rules"
+    # Set to False by the modules overriding _get_turnover_moves or
+    # _compute_turnover, so that the moves are valued with them
+    _turnover_in_sql = True
 
     @api.multi
     def _compute_currency_id(self):
@@ -83,11 +86,10 @@ class StockCycleCountRule(models.Model):
     @api.onchange('location_ids')
     def _onchange_locaton_ids(self):
         """Get the warehouses for the selected locations."""
-        wh_ids = []
-        for loc in self.location_ids:
-            wh_ids.append(loc.get_warehouse().id)
-        wh_ids = list(set(wh_ids))
-        self.warehouse_ids = self.env['stock.warehouse'].browse(wh_ids)
+        warehouses = self.env['stock.warehouse']
+        for wh in self.location_ids.get_warehouses().values():
+            warehouses |= wh
+        self.warehouse_ids = warehouses
 
     name = fields.Char(required=True)
     rule_type = fields.Selection(
@@ -147,14 +149,39 @@ class StockCycleCountRule(models.Model):
         }
         return cycle_count
 
+    @api.model
+    def _get_latest_inventory_dates(self, locs):
+        """ Find the date of the latest inventory of each location, in a
+        single query.
+        :param locs: stock.location recordset
+        :return: dict {location_id: datetime}, without the locations never
+                 inventoried
+        """
+        if not locs:
+            return {}
+        inventory_obj = self.env['stock.inventory']
+        query = inventory_obj._where_calc([
+            ('location_id', 'in', locs.ids),
+            ('state', 'in', ['confirm', 'done', 'draft'])])
+        inventory_obj._apply_ir_rules(query, 'read')
+        from_clause, where_clause, params = query.get_sql()
+        # pylint: disable=sql-injection
+        self.env.cr.execute("""
+            SELECT "stock_inventory"."location_id",
+                MAX("stock_inventory"."date")
+            FROM {from_clause}
+            WHERE {where_clause}
+            GROUP BY "stock_inventory"."location_id"
+        """.format(from_clause=from_clause, where_clause=where_clause),
+            params)
+        return dict(self.env.cr.fetchall())
+
     @api.model
     def _compute_rule_periodic(self, locs):
         cycle_counts = []
+        latest_inventory_dates = self._get_latest_inventory_dates(locs)
         for loc in locs:
-            latest_inventory_date = self.env['stock.inventory'].search([
-                ('location_id', '=', loc.id),
-                ('state', 'in', ['confirm', 'done', 'draft'])],
-                order="date desc", limit=1).date
+            latest_inventory_date = latest_inventory_dates.get(loc.id)
             if latest_inventory_date:
                 try:
                     period = self.periodic_count_period / \
@@ -173,6 +200,24 @@ class StockCycleCountRule(models.Model):
             cycle_counts.append(cycle_count)
         return cycle_counts
 
+    @api.model
+    def _get_periodic_locations_entering_horizon(self, locs, since, horizon):
+        """ Find the locations whose periodic count entered the planning
+        horizon since a date, the ones never inventoried being due from the
+        start.
+        :param locs: stock.location recordset
+        :param since: datetime
+        :param horizon: int, planning horizon in days
+        :return: stock.location recordset
+        """
+        period = self.periodic_count_period / self.periodic_qty_per_period
+        latest_inventory_dates = self._get_latest_inventory_dates(locs)
+        shift = timedelta(days=period - horizon)
+        now = datetime.now()
+        return locs.filtered(
+            lambda loc: loc.id in latest_inventory_dates and
+            since <= latest_inventory_dates[loc.id] + shift < now)
+
     @api.model
     def _get_turnover_moves(self, location, date):
         moves = self.env['stock.move'].search([
@@ -188,23 +233,92 @@ class StockCycleCountRule(models.Model):
         turnover = move.product_uom_qty * price
         return turnover
 
+    @api.model
+    def _compute_turnover_by_location(self, latest_inventory_dates):
+        """ Compute the turnover of several locations since their latest
+        inventory, in a single query over the done moves. The price of a move
+        is its unit price if any, otherwise the cost of the product, as
+        _compute_turnover does. If _turnover_in_sql is False, the moves of
+        each location are valued with _get_turnover_moves and
+        _compute_turnover instead.
+        :param latest_inventory_dates: dict {location_id: datetime}
+        :return: dict {location_id: turnover}, without the locations having
+                 no move since their latest inventory
+        """
+        if not latest_inventory_dates:
+            return {}
+        if not self._turnover_in_sql:
+            turnovers = {}
+            for location in self.env['stock.location'].browse(
+                    list(latest_inventory_dates)):
+                moves = self._get_turnover_moves(
+                    location, latest_inventory_dates[location.id])
+                if moves:
+                    turnovers[location.id] = sum(
+                        self._compute_turnover(move) for move in moves)
+            return turnovers
+        location_ids, dates = zip(*latest_inventory_dates.items())
+        # The moves within a location are counted once
+        self.env.cr.execute("""
+            SELECT moves.location_id, moves.product_id,
+                SUM(CASE WHEN ABS(COALESCE(moves.price_unit, 0.0))
+                              >= currency.rounding / 2
+                    THEN moves.product_uom_qty * moves.price_unit
+                    ELSE 0.0 END),
+                SUM(CASE WHEN ABS(COALESCE(moves.price_unit, 0.0))
+                              >= currency.rounding / 2
+                    THEN 0.0
+                    ELSE moves.product_uom_qty END)
+            FROM (
+                SELECT latest.location_id, move.product_id, move.company_id,
+                    move.product_uom_qty, move.price_unit
+                FROM unnest(
+                    %(location_ids)s::integer[], %(dates)s::timestamp[])
+                    AS latest(location_id, date)
+                JOIN stock_move move
+                    ON move.location_id = latest.location_id
+                    AND move.date > latest.date
+                WHERE move.state = 'done'
+                UNION ALL
+                SELECT latest.location_id, move.product_id, move.company_id,
+                    move.product_uom_qty, move.price_unit
+                FROM unnest(
+                    %(location_ids)s::integer[], %(dates)s::timestamp[])
+                    AS latest(location_id, date)
+                JOIN stock_move move
+                    ON move.location_dest_id = latest.location_id
+                    AND move.location_id != latest.location_id
+                    AND move.date > latest.date
+                WHERE move.state = 'done'
+            ) AS moves
+            JOIN res_company company ON company.id = moves.company_id
+            JOIN res_currency currency ON currency.id = company.currency_id
+            GROUP BY moves.location_id, moves.product_id
+        """, {
+            'location_ids': list(location_ids),
+            'dates': list(dates),
+        })
+        rows = self.env.cr.fetchall()
+        # The moves without price are valued at the cost of the product
+        products = self.env['product.product'].browse(
+            {row[1] for row in rows if row[3]})
+        costs = {product.id: product.standard_price for product in products}
+        turnovers = {}
+        for location_id, product_id, priced_turnover, unpriced_qty in rows:
+            turnovers[location_id] = turnovers.get(location_id, 0.0) + \
+                priced_turnover + unpriced_qty * costs.get(product_id, 0.0)
+        return turnovers
+
     @api.model
     def _compute_rule_turnover(self, locs):
         cycle_counts = []
+        latest_inventory_dates = self._get_latest_inventory_dates(locs)
+        turnovers = self._compute_turnover_by_location(latest_inventory_dates)
         for loc in locs:
-            last_inventories = self.env['stock.inventory'].search([
-                ('location_id', '=', loc.id),
-                ('state', 'in', ['confirm', 'done', 'draft'])]).mapped('date')
-            if last_inventories:
-                latest_inventory = sorted(last_inventories, reverse=True)[0]
-                moves = self._get_turnover_moves(loc, latest_inventory)
-                if moves:
-                    total_turnover = 0.0
-                    for m in moves:
-                        turnover = self._compute_turnover(m)
-                        total_turnover += turnover
+            if loc.id in latest_inventory_dates:
+                if loc.id in turnovers:
                     try:
-                        if total_turnover > \
+                        if turnovers[loc.id] > \
                                 self.turnover_inventory_value_threshold:
                             next_date = datetime.today()
                             cycle_count = self._propose_cycle_count(next_date,
@@ -39,16 +39,25 @@ class StockInventory(models.Model):
                 inv.cycle_count_id.state = 'done'
         return True
 
+    def _update_location_accuracy(self):
+        self.filtered(lambda inv: inv.state == 'done').mapped(
+            'location_id')._recompute_loc_accuracy()
+        return True
+
     @api.multi
-    def action_validate(self):
-        res = super(StockInventory, self).action_validate()
+    def _action_done(self):
+        res = super(StockInventory, self)._action_done()
         self._update_cycle_state()
+        self._update_location_accuracy()
         return res
 
     @api.multi
     def action_force_done(self):
+        # stock_inventory_discrepancy calls its parent's _action_done,
+        # skipping the override above
         res = super(StockInventory, self).action_force_done()
         self._update_cycle_state()
+        self._update_location_accuracy()
         return res
 
     @api.multi
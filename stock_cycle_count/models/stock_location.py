@@ -3,38 +3,77 @@
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
 
 import logging
+from collections import defaultdict
+from functools import partial
+from weakref import WeakKeyDictionary
 
-from odoo import api, fields, models, tools
+from odoo import api, fields, models, registry
 from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT
 from datetime import datetime
 _logger = logging.getLogger(__name__)
 
-try:
-    from statistics import mean
-    STATS_PATH = tools.find_in_path('statistics')
-except (ImportError, IOError) as err:
-    _logger.debug(err)
+# {cursor: set of location ids} of the zero-confirmations to check once the
+# transaction of the cursor is committed
+_pending_zero_confirmations = WeakKeyDictionary()
 
 
 class StockLocation(models.Model):
     _inherit = 'stock.location'
 
+    @api.multi
+    def _get_loc_accuracies(self):
+        """ Average the accuracy of the latest done inventories of the
+        locations, as many as set on their warehouse (all of them when it is
+        not set), in a single query.
+        :return: dict {location_id: accuracy} of the locations having done
+                 inventories
+        """
+        if not self.ids:
+            return {}
+        counts = {
+            location_id: wh.counts_for_accuracy_qty
+            for location_id, wh in self.get_warehouses().items()}
+        self.env.cr.execute("""
+            WITH history AS (
+                SELECT
+                    inv.location_id,
+                    inv.inventory_accuracy,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY inv.location_id
+                        ORDER BY inv.write_date DESC, inv.id DESC) AS rank
+                FROM stock_inventory inv
+                WHERE inv.state = 'done'
+                AND inv.location_id = ANY(%(location_ids)s)
+            )
+            SELECT history.location_id, AVG(history.inventory_accuracy)::float
+            FROM history
+            JOIN unnest(%(location_ids)s::integer[], %(counts)s::integer[])
+                AS location_counts(location_id, counts)
+                ON location_counts.location_id = history.location_id
+            WHERE location_counts.counts = 0
+            OR history.rank <= location_counts.counts
+            GROUP BY history.location_id
+        """, {
+            'location_ids': list(counts),
+            'counts': list(counts.values()),
+        })
+        return dict(self.env.cr.fetchall())
+
     @api.multi
     def _compute_loc_accuracy(self):
+        accuracies = self.filtered(
+            lambda loc: isinstance(loc.id, int))._get_loc_accuracies()
         for rec in self:
-            history = self.env['stock.inventory'].search([
-                ('location_id', '=', rec.id), ('state', '=', 'done')])
-            history = history.sorted(key=lambda r: r.write_date, reverse=True)
-            if history:
-                wh = rec.get_warehouse()
-                if wh.counts_for_accuracy_qty and \
-                        len(history) > wh.counts_for_accuracy_qty:
-                    rec.loc_accuracy = mean(
-                        history[:wh.counts_for_accuracy_qty].mapped(
-                            'inventory_accuracy'))
-                else:
-                    rec.loc_accuracy = mean(
-                        history.mapped('inventory_accuracy'))
+            rec.loc_accuracy = accuracies.get(rec.id, 0.0)
+
+    @api.multi
+    def _recompute_loc_accuracy(self):
+        """ Recompute the stored accuracy of the locations, in bulk """
+        # Store the accuracy of the inventories before averaging it
+        self.recompute()
+        self.env.add_todo(self._fields['loc_accuracy'], self)
+        self.recompute()
+        return True
 
     zero_confirmation_disabled = fields.Boolean(
         string='Disable Zero Confirmations',
@@ -51,7 +90,9 @@ class StockLocation(models.Model):
     )
     loc_accuracy = fields.Float(
         string='Inventory Accuracy', compute='_compute_loc_accuracy',
-        digits=(3, 2),
+        digits=(3, 2), store=True,
+        help='Average accuracy of the latest inventories of the location, '
+             'updated when an inventory of the location is done.',
     )
 
     @api.multi
@@ -64,42 +105,144 @@ class StockLocation(models.Model):
         return domain
 
     @api.multi
-    def check_zero_confirmation(self):
+    def _get_zero_confirmation_locations_domain(self):
+        """ Domain of the quants keeping the locations from being empty, the
+        batched counterpart of _get_zero_confirmation_domain, to override
+        along with it """
+        return [
+            ('location_id', 'in', self.ids),
+            ('quantity', '>', 0.0),
+        ]
+
+    @api.multi
+    def _get_not_empty_location_ids(self):
+        """ Find the locations having quants matching
+        _get_zero_confirmation_locations_domain, with a single query
+        :return: set of location ids
+        """
+        not_empty = self.env['stock.quant'].read_group(
+            self._get_zero_confirmation_locations_domain(),
+            ['location_id'], ['location_id'])
+        return {group['location_id'][0] for group in not_empty}
+
+    @api.multi
+    def _get_zero_confirmation_rules(self):
+        """ Find the zero-confirmation rule of the warehouse of each location,
+        resolving the warehouses and searching the rules once for all the
+        locations
+        :return: dict {location: (warehouse, rule)} of the locations whose
+                 warehouse has a zero-confirmation rule
+        """
+        warehouses = self.get_warehouses()
+        rules = self.env['stock.cycle.count.rule'].search([
+            ('rule_type', '=', 'zero'),
+            ('warehouse_ids', 'in', list(set(
+                wh.id for wh in warehouses.values() if wh)))])
+        rule_by_warehouse = {}
+        for rule in rules:
+            for wh in rule.warehouse_ids:
+                rule_by_warehouse.setdefault(wh, rule)
+        res = {}
         for rec in self:
-            if not rec.zero_confirmation_disabled:
-                wh = rec.get_warehouse()
-                rule_model = self.env['stock.cycle.count.rule']
-                zero_rule = rule_model.search([
-                    ('rule_type', '=', 'zero'),
-                    ('warehouse_ids', '=', wh.id)])
-                if zero_rule:
-                    quants = self.env['stock.quant'].search(
-                        rec._get_zero_confirmation_domain())
-                    if not quants:
-                        rec.create_zero_confirmation_cycle_count()
+            wh = warehouses[rec.id]
+            if wh in rule_by_warehouse:
+                res[rec] = (wh, rule_by_warehouse[wh])
+        return res
 
     @api.multi
-    def create_zero_confirmation_cycle_count(self):
-        self.ensure_one()
+    def check_zero_confirmation(self):
+        locations = self.filtered(
+            lambda loc: not loc.zero_confirmation_disabled)
+        if not locations:
+            return True
+        rules = locations._get_zero_confirmation_rules()
+        locations = locations.filtered(lambda loc: loc in rules)
+        if not locations:
+            return True
+        not_empty_ids = locations._get_not_empty_location_ids()
+        locations.filtered(
+            lambda loc: loc.id not in not_empty_ids
+        )._create_zero_confirmation_cycle_counts(rules)
+        return True
+
+    @api.multi
+    def _schedule_zero_confirmation(self):
+        """ Check the zero-confirmations of the locations, or when the
+        stock_cycle_count_zero_confirmation_after_commit system parameter is
+        set, once the transaction is committed, for all the locations
+        scheduled during the transaction at once.
+        """
+        if not self:
+            return True
+        if not self.env['ir.config_parameter'].sudo().get_param(
+                'stock_cycle_count_zero_confirmation_after_commit'):
+            return self.check_zero_confirmation()
+        cr = self.env.cr
+        pending = _pending_zero_confirmations.get(cr)
+        if pending is None:
+            pending = _pending_zero_confirmations[cr] = set()
+            cr.after('commit', partial(
+                self._check_zero_confirmation_after_commit, cr))
+            cr.after('rollback', partial(
+                _pending_zero_confirmations.pop, cr, None))
+        pending.update(self.ids)
+        return True
+
+    @api.multi
+    def _check_zero_confirmation_after_commit(self, cr):
+        location_ids = _pending_zero_confirmations.pop(cr, None)
+        if not location_ids:
+            return
+        try:
+            with api.Environment.manage(), \
+                    registry(cr.dbname).cursor() as new_cr:
+                env = api.Environment(new_cr, self.env.uid, self.env.context)
+                env['stock.location'].browse(
+                    location_ids).exists().check_zero_confirmation()
+        except Exception:
+            _logger.exception(
+                "Error while checking the zero-confirmations of the "
+                "locations %s", sorted(location_ids))
+
+    @api.multi
+    def _create_zero_confirmation_cycle_counts(self, rules):
+        """ Plan a zero-confirmation for each location, cancelling the counts
+        planned for them inside the horizon of their warehouse
+        :param rules: dict {location: (warehouse, rule)}, as returned by
+                      _get_zero_confirmation_rules; the locations missing
+                      from it are skipped
+        """
+        locations = self.filtered(lambda rec: rules.get(rec))
+        if not locations:
+            return True
+        cycle_count_model = self.env['stock.cycle.count']
         date = datetime.today().strftime(DEFAULT_SERVER_DATETIME_FORMAT)
-        wh_id = self.get_warehouse().id
-        date_horizon = self.get_warehouse().get_horizon_date().strftime(
-            DEFAULT_SERVER_DATETIME_FORMAT)
-        counts_planned = self.env['stock.cycle.count'].search([
-            ('date_deadline', '<', date_horizon), ('state', '=', 'draft'),
-            ('location_id', '=', self.id)])
+        location_ids_by_warehouse = defaultdict(list)
+        for rec in locations:
+            location_ids_by_warehouse[rules[rec][0]].append(rec.id)
+        counts_planned = cycle_count_model
+        for wh, location_ids in location_ids_by_warehouse.items():
+            date_horizon = wh.get_horizon_date().strftime(
+                DEFAULT_SERVER_DATETIME_FORMAT)
+            counts_planned |= cycle_count_model.search([
+                ('date_deadline', '<', date_horizon), ('state', '=', 'draft'),
+                ('location_id', 'in', location_ids)])
         if counts_planned:
             counts_planned.write({'state': 'cancelled'})
-        rule = self.env['stock.cycle.count.rule'].search([
-            ('rule_type', '=', 'zero'), ('warehouse_ids', '=', wh_id)])
-        self.env['stock.cycle.count'].create({
+        cycle_count_model.create([{
             'date_deadline': date,
-            'location_id': self.id,
-            'cycle_count_rule_id': rule.id,
+            'location_id': rec.id,
+            'cycle_count_rule_id': rules[rec][1].id,
             'state': 'draft'
-        })
+        } for rec in locations])
         return True
 
+    @api.multi
+    def create_zero_confirmation_cycle_count(self):
+        self.ensure_one()
+        return self._create_zero_confirmation_cycle_counts(
+            self._get_zero_confirmation_rules())
+
     @api.multi
     def action_accuracy_stats(self):
         self.ensure_one()
@@ -12,5 +12,5 @@ class StockMove(models.Model):
     @api.multi
     def _action_done(self):
         res = super()._action_done()
-        self.mapped("location_id").check_zero_confirmation()
+        self.mapped("location_id")._schedule_zero_confirmation()
         return res
@@ -2,12 +2,21 @@
 #   (http://www.eficent.com)
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
 
-from odoo import api, fields, models
+from odoo import api, fields, models, registry
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import partial
 import logging
+import threading
+import time
 
 _logger = logging.getLogger(__name__)
 
+# The write dates are the start of the transactions: look back far enough to
+# see the ones which were still running at the previous planning
+WATERMARK_OVERLAP = timedelta(minutes=10)
+
 
 class StockWarehouse(models.Model):
     _inherit = 'stock.warehouse'
@@ -27,6 +36,21 @@ class StockWarehouse(models.Model):
         default=1,
         help='Number of latest inventories used to calculate location '
              'accuracy')
+    cycle_count_watermark = fields.Datetime(
+        string='Cycle Counts Planned On', readonly=True, copy=False,
+        help='Date of the latest planning of the cycle counts. The '
+             'scheduled action only evaluates the rules again for the '
+             'locations which changed since then.')
+
+    @api.multi
+    def write(self, vals):
+        res = super(StockWarehouse, self).write(vals)
+        if 'counts_for_accuracy_qty' in vals:
+            self.env['stock.location'].search([
+                ('id', 'child_of', self.mapped(
+                    'view_location_id').ids),
+            ])._recompute_loc_accuracy()
+        return res
 
     @api.multi
     def get_horizon_date(self):
@@ -73,66 +97,321 @@ class StockWarehouse(models.Model):
             'state': 'draft'
         }
 
+    @api.model
+    def _get_earliest_cycle_count_proposals(self, proposed_cycle_counts):
+        """ Keep the earliest proposal of each location, the first one
+        proposed when several share the same date
+        :param proposed_cycle_counts: list of dicts with the location, date
+                                      and rule_type of each proposal
+        :return: dict {location: proposal}
+        """
+        earliest = {}
+        for proposal in proposed_cycle_counts:
+            current = earliest.get(proposal['location'])
+            if current is None or proposal['date'] < current['date']:
+                earliest[proposal['location']] = proposal
+        return earliest
+
+    @api.model
+    def _reset_cycle_count_watermark(self, locations):
+        """ Evaluate all the locations of the warehouses of some locations at
+        their next incremental planning, for the changes leaving no trace in
+        the touched locations, like the removal of a cycle count
+        :param locations: stock.location recordset
+        """
+        if not locations:
+            return
+        # Not written with the ORM, as the watermark itself
+        self.env.cr.execute("""
+            UPDATE stock_warehouse wh SET cycle_count_watermark = NULL
+            FROM stock_location view
+            WHERE view.id = wh.view_location_id
+            AND wh.cycle_count_watermark IS NOT NULL
+            AND EXISTS (
+                SELECT 1 FROM stock_location loc
+                WHERE loc.id IN %s
+                AND loc.parent_path LIKE view.parent_path || '%%')
+        """, (tuple(locations.ids),))
+        self.invalidate_cache(['cycle_count_watermark'])
+
+    @api.multi
+    def _get_cycle_count_touched_locations(self, since):
+        """ Find the locations of the warehouse whose cycle count may have
+        changed since a date: the ones with done moves, inventories, cycle
+        counts or changes of their own since then, and the ones with done
+        moves of the products whose cost changed since then.
+        :param since: datetime
+        :return: stock.location recordset
+        """
+        self.ensure_one()
+        self.env.cr.execute("""
+            WITH repriced AS (
+                SELECT DISTINCT split_part(res_id, ',', 2)::integer AS id
+                FROM ir_property
+                WHERE name = 'standard_price'
+                AND res_id LIKE 'product.product,%%'
+                AND write_date > %(since)s
+            )
+            SELECT loc.id
+            FROM stock_location loc
+            WHERE loc.parent_path LIKE %(parent_path)s
+            AND (
+                loc.write_date > %(since)s
+                OR EXISTS (
+                    SELECT 1 FROM stock_move move
+                    WHERE move.location_id = loc.id AND move.state = 'done'
+                    AND move.date > %(since)s)
+                OR EXISTS (
+                    SELECT 1 FROM stock_move move
+                    WHERE move.location_dest_id = loc.id
+                    AND move.state = 'done' AND move.date > %(since)s)
+                OR EXISTS (
+                    SELECT 1 FROM stock_inventory inv
+                    WHERE inv.location_id = loc.id
+                    AND inv.write_date > %(since)s)
+                OR EXISTS (
+                    SELECT 1 FROM stock_cycle_count cc
+                    WHERE cc.location_id = loc.id
+                    AND cc.write_date > %(since)s)
+                OR EXISTS (
+                    SELECT 1 FROM stock_move move
+                    JOIN repriced ON repriced.id = move.product_id
+                    WHERE move.location_id = loc.id AND move.state = 'done')
+                OR EXISTS (
+                    SELECT 1 FROM stock_move move
+                    JOIN repriced ON repriced.id = move.product_id
+                    WHERE move.location_dest_id = loc.id
+                    AND move.state = 'done')
+            )
+        """, {
+            'parent_path': self.view_location_id.parent_path + '%',
+            'since': since,
+        })
+        return self.env['stock.location'].browse(
+            [row[0] for row in self.env.cr.fetchall()])
+
     @api.multi
-    def action_compute_cycle_count_rules(self):
+    def _get_cycle_count_locations_to_compute(self, rule, since, touched):
+        """ Restrict the locations of a rule to the ones to evaluate again
+        since the previous planning: the touched locations, and for periodic
+        rules the ones whose count entered the planning horizon.
+        :return: stock.location recordset
+        """
+        self.ensure_one()
+        locations = self._search_cycle_count_locations(rule)
+        if rule.write_date > since:
+            return locations
+        if rule.rule_type == 'periodic':
+            touched |= rule._get_periodic_locations_entering_horizon(
+                locations - touched, since, self.cycle_count_planning_horizon)
+        return locations & touched
+
+    @api.multi
+    def action_compute_cycle_count_rules(self, incremental=False):
         """ Apply the rule in all the sublocations of a given warehouse(s) and
         returns a list with required dates for the cycle count of each
-        location """
+        location.
+        When incremental, only the locations which may need another count
+        since the previous planning of the warehouse are evaluated, unless
+        the warehouse changed since then. """
+        cycle_count_model = self.env['stock.cycle.count']
+        self.env.cr.execute("SELECT NOW() AT TIME ZONE 'UTC'")
+        now = self.env.cr.fetchone()[0]
         for rec in self:
+            since = touched = None
+            if incremental and rec.cycle_count_watermark:
+                since = rec.cycle_count_watermark - WATERMARK_OVERLAP
+                if rec.write_date > since:
+                    since = None
+                else:
+                    touched = rec._get_cycle_count_touched_locations(since)
             proposed_cycle_counts = []
             rules = rec._cycle_count_rules_to_compute()
             for rule in rules:
-                locations = rec._search_cycle_count_locations(rule)
+                if since:
+                    locations = rec._get_cycle_count_locations_to_compute(
+                        rule, since, touched)
+                else:
+                    locations = rec._search_cycle_count_locations(rule)
                 if locations:
                     proposed_cycle_counts.extend(rule.compute_rule(locations))
-            if proposed_cycle_counts:
-                locations = list(set([d['location'] for d in
-                                      proposed_cycle_counts]))
-                for loc in locations:
-                    proposed_for_loc = list(filter(
-                        lambda x: x['location'] == loc, proposed_cycle_counts))
-                    earliest_date = min([d['date'] for d in proposed_for_loc])
-                    cycle_count_proposed = list(filter(
-                        lambda x: x['date'] == earliest_date,
-                        proposed_for_loc))[0]
-                    domain = [('location_id', '=', loc.id),
-                              ('state', 'in', ['draft'])]
-                    existing_cycle_counts = self.env[
-                        'stock.cycle.count'].search(domain)
-                    if existing_cycle_counts:
-                        existing_earliest_date = sorted(
-                            existing_cycle_counts.mapped('date_deadline'))[0]
-                        existing_earliest_date = fields.Date.from_string(
-                            existing_earliest_date)
-                        cycle_count_proposed_date = fields.Date.from_string(
-                            cycle_count_proposed['date'])
-                        if (cycle_count_proposed_date <
-                                existing_earliest_date):
-                            cc_to_update = existing_cycle_counts.search([
-                                ('date_deadline', '=', existing_earliest_date)
-                            ])
-                            cc_to_update.write({
-                                'date_deadline': cycle_count_proposed_date,
-                                'cycle_count_rule_id': cycle_count_proposed[
-                                    'rule_type'].id,
-                            })
-                    delta = (fields.Datetime.from_string(
-                        cycle_count_proposed['date']) - datetime.today())
-                    if not existing_cycle_counts and \
-                            delta.days < rec.cycle_count_planning_horizon:
-                        cc_vals = self._prepare_cycle_count(
-                            cycle_count_proposed)
-                        self.env['stock.cycle.count'].create(cc_vals)
+            # Not written with the ORM to keep the write date of the
+            # warehouse, which tells whether it changed since the watermark
+            self.env.cr.execute("""
+                UPDATE stock_warehouse SET cycle_count_watermark = %s
+                WHERE id = %s
+            """, (now, rec.id))
+            rec.invalidate_cache(['cycle_count_watermark'], rec.ids)
+            if not proposed_cycle_counts:
+                continue
+            earliest_proposals = self._get_earliest_cycle_count_proposals(
+                proposed_cycle_counts)
+            existing_by_location = defaultdict(list)
+            for cycle_count in cycle_count_model.search([
+                    ('location_id', 'in',
+                     [loc.id for loc in earliest_proposals]),
+                    ('state', '=', 'draft')]):
+                existing_by_location[cycle_count.location_id.id].append(
+                    cycle_count)
+            to_update = defaultdict(list)
+            to_create = []
+            for loc, cycle_count_proposed in earliest_proposals.items():
+                existing_cycle_counts = existing_by_location.get(loc.id)
+                if existing_cycle_counts:
+                    existing_earliest_date = min(
+                        cc.date_deadline for cc in existing_cycle_counts)
+                    cycle_count_proposed_date = fields.Date.from_string(
+                        cycle_count_proposed['date'])
+                    if cycle_count_proposed_date < existing_earliest_date:
+                        to_update[(
+                            cycle_count_proposed_date,
+                            cycle_count_proposed['rule_type'].id,
+                        )].extend(
+                            cc.id for cc in existing_cycle_counts
+                            if cc.date_deadline == existing_earliest_date)
+                    continue
+                delta = (fields.Datetime.from_string(
+                    cycle_count_proposed['date']) - datetime.today())
+                if delta.days < rec.cycle_count_planning_horizon:
+                    to_create.append(
+                        self._prepare_cycle_count(cycle_count_proposed))
+            for (date_deadline, rule_id), cc_ids in to_update.items():
+                cycle_count_model.browse(cc_ids).write({
+                    'date_deadline': date_deadline,
+                    'cycle_count_rule_id': rule_id,
+                })
+            if to_create:
+                cycle_count_model.create(to_create)
+
+    @api.model
+    def _get_cycle_count_cron_workers(self):
+        """ Number of warehouses planned in parallel by the scheduled
+        action, each in its own transaction """
+        return max(int(self.env['ir.config_parameter'].sudo().get_param(
+            'stock_cycle_count_cron_workers', 1)), 1)
+
+    @api.model
+    def _compute_cycle_count_rules_isolated(self, dbname, warehouse_ids):
+        """ Plan the cycle counts of warehouses one after the other, each in
+        a new transaction, committed unless it fails
+        :return: list of tuples (warehouse id, duration, error or None)
+        """
+        results = []
+        for warehouse_id in warehouse_ids:
+            start = time.time()
+            error = None
+            try:
+                with api.Environment.manage(), \
+                        registry(dbname).cursor() as cr:
+                    env = api.Environment(
+                        cr, self.env.uid, self.env.context)
+                    env['stock.warehouse'].browse(
+                        warehouse_id).action_compute_cycle_count_rules(
+                            incremental=True)
+            except Exception as e:
+                _logger.exception(
+                    "Error while planning the cycle counts of the warehouse "
+                    "%d", warehouse_id)
+                error = e
+            results.append((warehouse_id, time.time() - start, error))
+        return results
+
+    @api.multi
+    def _get_cycle_count_cron_groups(self):
+        """ Group the warehouses whose rules may evaluate the same locations,
+        for a single worker to plan each group, one warehouse after the
+        other: planned at the same time, they would not see each other's
+        cycle counts.
+        :return: list of stock.warehouse recordsets
+        """
+        # Locations whose sublocations are evaluated, as (parent_path, wh)
+        roots = []
+        for wh in self:
+            for rule in wh._cycle_count_rules_to_compute():
+                if rule.apply_in == 'warehouse':
+                    roots.append((wh.view_location_id.parent_path, wh))
+                elif rule.apply_in == 'location':
+                    roots.extend(
+                        (loc.parent_path, wh) for loc in rule.location_ids)
+        parents = {wh: wh for wh in self}
+
+        def find(wh):
+            while parents[wh] != wh:
+                parents[wh] = parents[parents[wh]]
+                wh = parents[wh]
+            return wh
+
+        # The sorted paths follow the tree: join each warehouse to the one
+        # of the nearest location above or equal
+        ancestors = []
+        for path, wh in sorted(roots, key=lambda root: root[0]):
+            while ancestors and not path.startswith(ancestors[-1][0]):
+                ancestors.pop()
+            if ancestors:
+                parents[find(wh)] = find(ancestors[-1][1])
+            ancestors.append((path, wh))
+        groups = {}
+        for wh in self:
+            group = find(wh)
+            groups[group] = groups.get(group, self.browse()) | wh
+        return list(groups.values())
+
+    @api.multi
+    def _compute_cycle_count_rules_savepoint(self):
+        """ Plan the cycle counts of the warehouses one after the other in
+        the current transaction, rolling back only the failing ones
+        :return: list of tuples (warehouse id, duration, error or None)
+        """
+        results = []
+        for wh in self:
+            start = time.time()
+            error = None
+            try:
+                with self.env.cr.savepoint():
+                    wh.action_compute_cycle_count_rules(incremental=True)
+            except Exception as e:
+                _logger.exception(
+                    "Error while planning the cycle counts of the warehouse "
+                    "%d", wh.id)
+                self.invalidate_cache()
+                error = e
+            results.append((wh.id, time.time() - start, error))
+        return results
 
     @api.model
     def cron_cycle_count(self):
         _logger.info("stock_cycle_count cron job started.")
-        try:
-            whs = self.search([])
-            whs.action_compute_cycle_count_rules()
-        except Exception as e:
-            _logger.info(
-                "Error while running stock_cycle_count cron job: %s", str(e))
-            raise
-        _logger.info("stock_cycle_count cron job ended.")
+        start = time.time()
+        whs = self.search([])
+        workers = self._get_cycle_count_cron_workers()
+        if (workers > 1 and len(whs) > 1 and
+                not self.env.registry.in_test_mode() and
+                not getattr(threading.currentThread(), 'testing', False)):
+            dbname = self.env.cr.dbname
+            groups = whs._get_cycle_count_cron_groups()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = [
+                    result for group_results in executor.map(
+                        partial(self._compute_cycle_count_rules_isolated,
+                                dbname),
+                        [group.ids for group in groups])
+                    for result in group_results]
+        else:
+            results = whs._compute_cycle_count_rules_savepoint()
+        failed = []
+        for warehouse_id, duration, error in results:
+            if error is None:
+                _logger.info(
+                    "Cycle counts of the warehouse %d planned in %.3fs.",
+                    warehouse_id, duration)
+            else:
+                failed.append(warehouse_id)
+                _logger.error(
+                    "Cycle counts of the warehouse %d failed after %.3fs: "
+                    "%s", warehouse_id, duration, error)
+        _logger.info(
+            "stock_cycle_count cron job ended in %.3fs: %d warehouses "
+            "planned, %d failed%s.", time.time() - start,
+            len(results) - len(failed), len(failed),
+            failed and " (%s)" % ", ".join(map(str, failed)) or "")
         return True
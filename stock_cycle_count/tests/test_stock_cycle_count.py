@@ -5,7 +5,10 @@ from odoo.tests import common
 from odoo.exceptions import ValidationError
 from odoo.exceptions import AccessError
 
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
 
 class TestStockCycleCount(common.TransactionCase):
@@ -274,3 +277,352 @@ class TestStockCycleCount(common.TransactionCase):
         with self.assertRaises(ValidationError):
             self.zero_rule.warehouse_ids = [
                 (4, self.small_wh.id)]
+
+    def test_rule_periodic_latest_inventory(self):
+        """Tests the periodic rules start from the latest inventory of each
+        location."""
+        loc_1 = self.big_wh.lot_stock_id
+        loc_2 = self.small_wh.lot_stock_id
+        for days in (20, 5, 10):
+            self.inventory_model.create({
+                'name': 'Past inventory',
+                'location_id': loc_1.id,
+                'date': datetime.today() - timedelta(days=days),
+            })
+        latest_dates = self.rule_periodic._get_latest_inventory_dates(
+            loc_1 | loc_2)
+        self.assertEqual(list(latest_dates), [loc_1.id])
+        self.assertEqual(
+            (datetime.today() - latest_dates[loc_1.id]).days, 5)
+        proposals = self.rule_periodic._compute_rule_periodic(loc_1 | loc_2)
+        proposed_dates = {
+            proposal['location']: proposal['date'] for proposal in proposals}
+        # 7 days for 2 counts: 3.5 days after the latest one, overdue
+        self.assertEqual(proposed_dates[loc_1].date(), datetime.today().date())
+        self.assertEqual(proposed_dates[loc_2].date(), datetime.today().date())
+        self.rule_periodic.periodic_count_period = 28
+        proposals = self.rule_periodic._compute_rule_periodic(loc_1)
+        self.assertEqual(
+            proposals[0]['date'].date(),
+            (latest_dates[loc_1.id] + timedelta(days=14)).date())
+
+    def test_rule_turnover(self):
+        """Tests the turnover of the locations is computed in bulk as it is
+        move by move."""
+        loc = self.big_wh.lot_stock_id
+        self.product1.standard_price = 30.0
+        self.inventory_model.create({
+            'name': 'Past inventory',
+            'location_id': loc.id,
+            'date': datetime.today() - timedelta(days=1),
+        })
+        self.quant_model.create({
+            'product_id': self.product1.id,
+            'location_id': self.count_loc.id,
+            'quantity': 5.0,
+        })
+        move = self.stock_move_model.create({
+            'name': 'Move since the inventory',
+            'product_id': self.product1.id,
+            'product_uom_qty': 5.0,
+            'product_uom': self.product1.uom_id.id,
+            'location_id': self.count_loc.id,
+            'location_dest_id': loc.id,
+        })
+        move._action_confirm()
+        move._action_assign()
+        move.move_line_ids[0].qty_done = 5.0
+        move._action_done()
+
+        latest_dates = self.rule_turnover._get_latest_inventory_dates(loc)
+        moves = self.rule_turnover._get_turnover_moves(
+            loc, latest_dates[loc.id])
+        self.assertEqual(moves, move)
+        turnovers = self.rule_turnover._compute_turnover_by_location(
+            latest_dates)
+        self.assertAlmostEqual(turnovers[loc.id], 150.0)
+        self.assertAlmostEqual(
+            turnovers[loc.id], self.rule_turnover._compute_turnover(move))
+        # The overrides of the valuation of a move are honoured when they
+        # disable the valuation in SQL
+        with patch.object(
+                type(self.rule_turnover), '_compute_turnover',
+                autospec=True, return_value=1000.0), patch.object(
+                type(self.rule_turnover), '_turnover_in_sql', False):
+            turnovers = self.rule_turnover._compute_turnover_by_location(
+                latest_dates)
+        self.assertAlmostEqual(turnovers[loc.id], 1000.0)
+        proposals = self.rule_turnover._compute_rule_turnover(loc)
+        self.assertEqual([p['location'] for p in proposals], [loc])
+        self.rule_turnover.turnover_inventory_value_threshold = 200.0
+        self.assertFalse(self.rule_turnover._compute_rule_turnover(loc))
+
+    def test_loc_accuracy(self):
+        """Tests the accuracy of the locations is stored when their
+        inventories are done."""
+        loc = self.small_wh.lot_stock_id
+        self.quant_model.create({
+            'product_id': self.product1.id,
+            'location_id': loc.id,
+            'quantity': 10.0,
+        })
+        accuracies = []
+        for product_qty in (10.0, 5.0):
+            inventory = self.inventory_model.create({
+                'name': 'Accuracy inventory',
+                'location_id': loc.id,
+            })
+            inventory.action_start()
+            inventory.line_ids.write({'product_qty': product_qty})
+            inventory.action_validate()
+            accuracies.append(inventory.inventory_accuracy)
+        self.assertEqual(accuracies, [100.0, 50.0])
+        # Only the latest inventory counts by default
+        self.assertAlmostEqual(loc.loc_accuracy, 50.0)
+        self.small_wh.counts_for_accuracy_qty = 0
+        self.assertAlmostEqual(loc.loc_accuracy, 75.0)
+        self.assertEqual(loc._get_loc_accuracies(), {loc.id: 75.0})
+        self.assertFalse(self.big_wh.lot_stock_id.loc_accuracy)
+
+    def test_loc_accuracy_tracking(self):
+        """Tests the accuracy of the locations is stored when their
+        inventories are confirmed without the lots."""
+        loc = self.small_wh.lot_stock_id
+        product = self.product_model.create({
+            'name': 'Lot product',
+            'type': 'product',
+            'tracking': 'lot',
+        })
+        self.quant_model.create({
+            'product_id': product.id,
+            'location_id': loc.id,
+            'quantity': 10.0,
+        })
+        inventory = self.inventory_model.create({
+            'name': 'Accuracy inventory',
+            'location_id': loc.id,
+        })
+        inventory.action_start()
+        inventory.line_ids.write({'product_qty': 5.0})
+        res = inventory.action_validate()
+        self.assertEqual(res['res_model'], 'stock.track.confirmation')
+        self.assertNotEqual(inventory.state, 'done')
+        self.env['stock.track.confirmation'].browse(
+            res['res_id']).action_confirm()
+        self.assertEqual(inventory.state, 'done')
+        self.assertAlmostEqual(loc.loc_accuracy, 50.0)
+
+    def test_cycle_count_consolidation(self):
+        """Tests the earliest proposal of each location is planned once."""
+        loc_1 = self.big_wh.lot_stock_id
+        loc_2 = self.small_wh.lot_stock_id
+        today = datetime.today()
+        proposals = [
+            {'location': loc_1, 'date': today + timedelta(days=5),
+             'rule_type': self.rule_periodic},
+            {'location': loc_2, 'date': today + timedelta(days=3),
+             'rule_type': self.rule_periodic},
+            {'location': loc_1, 'date': today + timedelta(days=2),
+             'rule_type': self.rule_turnover},
+            {'location': loc_1, 'date': today + timedelta(days=2),
+             'rule_type': self.rule_accuracy},
+        ]
+        earliest = self.big_wh._get_earliest_cycle_count_proposals(proposals)
+        self.assertEqual(earliest, {loc_1: proposals[2], loc_2: proposals[1]})
+        self.big_wh.action_compute_cycle_count_rules()
+        counts = self.cycle_count_model.search([
+            ('location_id', 'child_of', self.big_wh.view_location_id.id),
+            ('state', '=', 'draft')])
+        self.assertTrue(counts, 'Cycle counts not planned')
+        self.assertEqual(
+            len(counts), len(counts.mapped('location_id')),
+            'Several cycle counts planned for the same location.')
+        self.assertEqual(
+            len(set(counts.mapped('name'))), len(counts),
+            'Cycle counts created without their own reference.')
+        self.big_wh.action_compute_cycle_count_rules()
+        self.assertEqual(
+            self.cycle_count_model.search([
+                ('location_id', 'child_of', self.big_wh.view_location_id.id),
+                ('state', '=', 'draft')]), counts,
+            'Cycle counts planned twice.')
+
+    def test_zero_confirmation_batch(self):
+        """Tests the zero-confirmations of several locations are checked at
+        once."""
+        locs = self.stock_location_model
+        for name, wh in (('Empty', self.big_wh), ('Full', self.big_wh),
+                         ('No rule', self.small_wh)):
+            locs |= self.stock_location_model.create({
+                'name': name,
+                'usage': 'internal',
+                'location_id': wh.lot_stock_id.id,
+            })
+        self.quant_model.create({
+            'product_id': self.product1.id,
+            'location_id': locs[1].id,
+            'quantity': 1.0,
+        })
+        rules = locs._get_zero_confirmation_rules()
+        self.assertEqual(rules, {
+            locs[0]: (self.big_wh, self.zero_rule),
+            locs[1]: (self.big_wh, self.zero_rule),
+        })
+        self.env['ir.config_parameter'].sudo().set_param(
+            'stock_cycle_count_zero_confirmation_after_commit', '1')
+        locs._schedule_zero_confirmation()
+        self.assertFalse(self.cycle_count_model.search([
+            ('location_id', 'in', locs.ids)]),
+            'Zero confirmation not deferred.')
+
+        # Run the check scheduled after the commit, in this transaction
+        @contextmanager
+        def cursor():
+            yield self.cr
+
+        with patch('odoo.addons.stock_cycle_count.models.stock_location.'
+                   'registry') as registry_mock:
+            registry_mock.return_value.cursor = cursor
+            locs._check_zero_confirmation_after_commit(self.cr)
+        counts = self.cycle_count_model.search([
+            ('location_id', 'in', locs.ids)])
+        self.assertEqual(counts.mapped('location_id'), locs[0])
+        self.assertEqual(counts.cycle_count_rule_id, self.zero_rule)
+
+        # The locations without rule are skipped
+        locs[2].create_zero_confirmation_cycle_count()
+        self.assertFalse(self.cycle_count_model.search([
+            ('location_id', '=', locs[2].id)]))
+
+        # The domain of the locations is honoured when overridden
+        location_class = type(self.stock_location_model)
+        with patch.object(
+                location_class, '_get_zero_confirmation_locations_domain',
+                autospec=True, side_effect=lambda locations: [
+                    ('location_id', 'in', locations.ids),
+                    ('quantity', '>', 1.0)]):
+            self.assertFalse(locs._get_not_empty_location_ids())
+        self.assertEqual(locs._get_not_empty_location_ids(), {locs[1].id})
+
+    def test_cron_cycle_count_failure(self):
+        """Tests a failing warehouse does not prevent planning the others."""
+        failing_wh = self.env.ref('stock.warehouse0')
+        warehouse_class = type(self.stock_warehouse_model)
+        action_compute = warehouse_class.action_compute_cycle_count_rules
+
+        def action_compute_failing(whs, **kwargs):
+            if failing_wh in whs:
+                raise ValidationError('Broken warehouse')
+            return action_compute(whs, **kwargs)
+
+        with patch.object(warehouse_class, 'action_compute_cycle_count_rules',
+                          action_compute_failing):
+            self.assertTrue(self.stock_warehouse_model.cron_cycle_count())
+        counts = self.cycle_count_model.search([
+            ('location_id', 'child_of', self.big_wh.view_location_id.id)])
+        self.assertTrue(counts, 'Cycle counts not planned')
+
+    def test_cron_cycle_count_threads(self):
+        """Tests the scheduled action plans the warehouses in parallel, the
+        ones sharing locations by the same worker."""
+        # The small warehouse also evaluates the zone of the big one
+        self.small_wh.cycle_count_rule_ids = [(4, self.rule_accuracy.id)]
+        whs = self.stock_warehouse_model.search([])
+        groups = whs._get_cycle_count_cron_groups()
+        self.assertEqual(
+            sum(len(group) for group in groups), len(whs))
+        self.assertIn(self.big_wh | self.small_wh, groups)
+
+        planned = []
+
+        def compute_isolated(whs_model, dbname, warehouse_ids):
+            planned.append(sorted(warehouse_ids))
+            return [(wh_id, 0.0, None) for wh_id in warehouse_ids]
+
+        self.env['ir.config_parameter'].sudo().set_param(
+            'stock_cycle_count_cron_workers', '4')
+        warehouse_class = type(self.stock_warehouse_model)
+        with patch.object(warehouse_class,
+                          '_compute_cycle_count_rules_isolated',
+                          autospec=True, side_effect=compute_isolated), \
+                patch.object(self.registry, 'in_test_mode',
+                             return_value=False), \
+                patch.object(threading.currentThread(), 'testing', False,
+                             create=True):
+            self.assertTrue(self.stock_warehouse_model.cron_cycle_count())
+        self.assertEqual(
+            sorted(wh_id for ids in planned for wh_id in ids),
+            sorted(whs.ids))
+        self.assertIn(sorted((self.big_wh | self.small_wh).ids), planned)
+
+    def test_cycle_count_incremental(self):
+        """Tests the incremental planning only evaluates the locations which
+        changed since the previous one."""
+        wh = self.big_wh
+        loc = wh.lot_stock_id
+        domain = [
+            ('location_id', 'child_of', wh.view_location_id.id),
+            ('state', '=', 'draft')]
+
+        def set_watermark():
+            # Pretend the previous planning happened after all the changes
+            # done in this transaction
+            self.env.cr.execute("""
+                UPDATE stock_warehouse
+                SET cycle_count_watermark = NOW() AT TIME ZONE 'UTC'
+                    + INTERVAL '1 hour'
+                WHERE id = %s
+            """, (wh.id,))
+            wh.invalidate_cache()
+
+        # Without watermark, the first planning evaluates all the locations
+        wh.action_compute_cycle_count_rules(incremental=True)
+        self.assertTrue(wh.cycle_count_watermark)
+        self.cycle_count_model.search(domain).unlink()
+        # The removal of planned counts plans all the locations again
+        self.assertFalse(wh.cycle_count_watermark)
+        set_watermark()
+        wh.action_compute_cycle_count_rules(incremental=True)
+        self.assertFalse(self.cycle_count_model.search(domain))
+
+        self.quant_model.create({
+            'product_id': self.product1.id,
+            'location_id': self.count_loc.id,
+            'quantity': 1.0,
+        })
+        move = self.stock_move_model.create({
+            'name': 'Move after the planning',
+            'product_id': self.product1.id,
+            'product_uom_qty': 1.0,
+            'product_uom': self.product1.uom_id.id,
+            'location_id': self.count_loc.id,
+            'location_dest_id': loc.id,
+        })
+        move._action_confirm()
+        move._action_assign()
+        move.move_line_ids[0].qty_done = 1.0
+        move._action_done()
+        set_watermark()
+        self.env.cr.execute("""
+            UPDATE stock_move SET date = %s WHERE id = %s
+        """, (wh.cycle_count_watermark + timedelta(hours=1), move.id))
+        wh.action_compute_cycle_count_rules(incremental=True)
+        counts = self.cycle_count_model.search(domain)
+        self.assertEqual(counts.mapped('location_id'), loc)
+
+        # A change of the cost of a product touches the locations of its
+        # moves
+        since = wh.cycle_count_watermark + timedelta(hours=3)
+        self.assertFalse(wh._get_cycle_count_touched_locations(since))
+        self.product1.standard_price = 10.0
+        self.env.cr.execute("""
+            UPDATE ir_property SET write_date = %s
+            WHERE name = 'standard_price' AND res_id = %s
+        """, (since + timedelta(hours=1),
+              'product.product,%d' % self.product1.id))
+        self.assertEqual(wh._get_cycle_count_touched_locations(since), loc)
+
+        # The full planning evaluates all the locations again
+        wh.action_compute_cycle_count_rules()
+        self.assertGreater(
+            len(self.cycle_count_model.search(domain)), len(counts))
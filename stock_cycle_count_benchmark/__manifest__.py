@@ -0,0 +1,17 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+{
+    "name": "Benchmarks of the cycle count planning",
+    "summary": "Measure the time and queries spent planning the cycle counts "
+               "of a synthetic warehouse",
+    "version": "12.0.1.0.0",
+    "author": "Omdatech, Odoo Community Association (OCA)",
+    "website": "https://github.com/OCA/stock-logistics-warehouse",
+    "category": "Hidden",
+    "depends": [
+        "stock_benchmark",
+        "stock_cycle_count",
+    ],
+    "license": "AGPL-3",
+    "installable": True,
+}
@@ -0,0 +1,174 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+import os
+from datetime import datetime, timedelta
+
+from odoo.addons.stock_benchmark.tests.common import BenchmarkCase
+
+SIZES = {
+    'bins': 100,
+    'inventories': 2,
+    'products': 10,
+    'moves': 200,
+    'emptied': 20,
+}
+
+
+class TestBenchmark(BenchmarkCase):
+
+    benchmark_prefix = 'STOCK_CYCLE_COUNT_BENCHMARK'
+    benchmark_sizes = SIZES
+    benchmark_baseline_path = os.path.join(
+        os.path.dirname(__file__), 'query_counts.json')
+
+    @classmethod
+    def _generate_data(cls, bins, inventories, products, moves, emptied):
+        """ Create a synthetic warehouse and its history
+        :param bins: int, number of bins
+        :param inventories: int, number of past inventories per bin
+        :param products: int, number of products
+        :param moves: int, number of done moves into the bins
+        :param emptied: int, number of bins to empty with moves
+        """
+        cls.warehouse = cls.env['stock.warehouse'].create({
+            'name': 'Benchmark warehouse',
+            'code': 'BCH',
+            'cycle_count_planning_horizon': 30,
+            'counts_for_accuracy_qty': inventories,
+        })
+        stock_location = cls.warehouse.lot_stock_id
+        supplier_location = cls.env.ref('stock.stock_location_suppliers')
+
+        rule_model = cls.env['stock.cycle.count.rule']
+        cls.rules = rule_model.create({
+            'name': 'Benchmark periodic',
+            'rule_type': 'periodic',
+            'periodic_qty_per_period': 1,
+            'periodic_count_period': 30,
+        })
+        cls.rules |= rule_model.create({
+            'name': 'Benchmark turnover',
+            'rule_type': 'turnover',
+            'turnover_inventory_value_threshold': 100.0,
+        })
+        cls.rules |= rule_model.create({
+            'name': 'Benchmark accuracy',
+            'rule_type': 'accuracy',
+            'accuracy_threshold': 90.0,
+        })
+        cls.rules |= rule_model.create({
+            'name': 'Benchmark zero',
+            'rule_type': 'zero',
+        })
+        cls.warehouse.cycle_count_rule_ids = cls.rules
+
+        cls.bins = cls.env['stock.location']
+        for index in range(bins):
+            cls.bins |= cls.env['stock.location'].create({
+                'name': 'Benchmark bin %d' % index,
+                'usage': 'internal',
+                'location_id': stock_location.id,
+            })
+        cls.emptied_bins = cls.env['stock.location']
+        for index in range(emptied):
+            cls.emptied_bins |= cls.env['stock.location'].create({
+                'name': 'Benchmark emptied bin %d' % index,
+                'usage': 'internal',
+                'location_id': stock_location.id,
+            })
+
+        cls.products = cls.env['product.product']
+        for index in range(products):
+            cls.products |= cls.env['product.product'].create({
+                'name': 'Benchmark product %d' % index,
+                'type': 'product',
+                'standard_price': 1.0 + index,
+            })
+
+        inventory_model = cls.env['stock.inventory']
+        today = datetime.today()
+        for index, location in enumerate(cls.bins):
+            for count in range(inventories):
+                inventory = inventory_model.create({
+                    'name': 'Benchmark inventory',
+                    'location_id': location.id,
+                    'date': today - timedelta(
+                        days=(index + 30 * count) % 90),
+                })
+                # Done without lines, with an accuracy of 80 to 100%
+                cls.env.cr.execute("""
+                    UPDATE stock_inventory
+                    SET state = 'done', inventory_accuracy = %s
+                    WHERE id = %s
+                """, (80.0 + (index + count) % 21, inventory.id))
+        inventory_model.invalidate_cache()
+        cls.bins._recompute_loc_accuracy()
+
+        stock_moves = cls.env['stock.move']
+        for index in range(moves):
+            product = cls.products[index % products]
+            stock_moves |= cls.env['stock.move'].create({
+                'name': 'Benchmark move %d' % index,
+                'product_id': product.id,
+                'product_uom': product.uom_id.id,
+                'product_uom_qty': 1.0 + index % 5,
+                'location_id': supplier_location.id,
+                'location_dest_id': cls.bins[index % bins].id,
+            })
+        cls._validate_moves(stock_moves)
+        for index, location in enumerate(cls.emptied_bins):
+            cls.env['stock.quant']._update_available_quantity(
+                cls.products[index % products], location, 1.0)
+
+    @classmethod
+    def _validate_moves(cls, moves):
+        moves._action_confirm()
+        moves._action_assign()
+        for move_line in moves.mapped('move_line_ids'):
+            move_line.qty_done = move_line.product_uom_qty
+        return moves._action_done()
+
+    def test_cron_cycle_count(self):
+        self._measure(
+            'cron_cycle_count',
+            lambda: self.env['stock.warehouse'].cron_cycle_count())
+        self.assertTrue(self.env['stock.cycle.count'].search([
+            ('location_id', 'in', self.bins.ids)]))
+
+    def test_compute_rules(self):
+        for rule in self.rules.filtered(lambda r: r.rule_type != 'zero'):
+            locations = self.warehouse._search_cycle_count_locations(rule)
+            self._measure(
+                'rule_%s' % rule.rule_type,
+                lambda: rule.compute_rule(locations))
+
+    def test_compute_loc_accuracy(self):
+        self._measure(
+            'compute_loc_accuracy', self.bins._recompute_loc_accuracy)
+        self.assertTrue(all(self.bins.mapped('loc_accuracy')))
+
+    def test_zero_confirmation(self):
+        customer_location = self.env.ref('stock.stock_location_customers')
+        quants = self.env['stock.quant'].search([
+            ('location_id', 'in', self.emptied_bins.ids)])
+        moves = self.env['stock.move']
+        for quant in quants:
+            moves |= self.env['stock.move'].create({
+                'name': 'Benchmark emptying move',
+                'product_id': quant.product_id.id,
+                'product_uom': quant.product_id.uom_id.id,
+                'product_uom_qty': quant.quantity,
+                'location_id': quant.location_id.id,
+                'location_dest_id': customer_location.id,
+            })
+        moves._action_confirm()
+        moves._action_assign()
+        for move_line in moves.mapped('move_line_ids'):
+            move_line.qty_done = move_line.product_uom_qty
+        self._measure('zero_confirmation', moves._action_done)
+        zero_counts = self.env['stock.cycle.count'].search([
+            ('location_id', 'in', self.emptied_bins.ids),
+            ('cycle_count_rule_id.rule_type', '=', 'zero')])
+        self.assertEqual(
+            zero_counts.mapped('location_id'), self.emptied_bins)
@@ -0,0 +1,11 @@
+# Copyright 2026 Omdatech
+# License LGPL-3.0 or later (https://www.gnu.org/licenses/lgpl.html).
+
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['stock.demand.estimate.index'].rebuild()
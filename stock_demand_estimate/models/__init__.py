@@ -1 +1,2 @@
 from . import stock_demand_estimate
+from . import stock_demand_estimate_index
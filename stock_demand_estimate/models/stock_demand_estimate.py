@@ -8,6 +8,12 @@ from odoo.exceptions import UserError
 
 from datetime import timedelta, date
 
+# The fields the index of the demand is computed from
+INDEX_FIELDS = {
+    'product_id', 'location_id', 'company_id', 'date_from', 'date_to',
+    'duration', 'product_qty',
+}
+
 
 class StockDemandEstimate(models.Model):
     _name = 'stock.demand.estimate'
@@ -122,6 +128,51 @@ class StockDemandEstimate(models.Model):
             'of the `product_uom_qty`.'
         ))
 
+    @api.multi
+    def _get_index_keys(self):
+        return {
+            (rec.product_id.id, rec.location_id.id, rec.company_id.id)
+            for rec in self}
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        # The keys are refreshed once at the end, not by each _write
+        res = super(StockDemandEstimate, self.with_context(
+            demand_index_deferred=True)).create(vals_list)
+        res.recompute()
+        self.env['stock.demand.estimate.index']._refresh(
+            res._get_index_keys())
+        return res.with_env(self.env)
+
+    @api.multi
+    def write(self, vals):
+        keys = self._get_index_keys()
+        # The keys are refreshed once at the end, not by each _write
+        deferred = self.with_context(demand_index_deferred=True)
+        res = super(StockDemandEstimate, deferred).write(vals)
+        deferred.recompute()
+        self.env['stock.demand.estimate.index']._refresh(
+            keys | self._get_index_keys())
+        return res
+
+    @api.multi
+    def _write(self, vals):
+        # Also called to store the fields recomputed when other records
+        # change, outside of create and write
+        res = super(StockDemandEstimate, self)._write(vals)
+        if INDEX_FIELDS.intersection(vals) and \
+                not self.env.context.get('demand_index_deferred'):
+            self.env['stock.demand.estimate.index']._refresh(
+                self._get_index_keys())
+        return res
+
+    @api.multi
+    def unlink(self):
+        keys = self._get_index_keys()
+        res = super(StockDemandEstimate, self).unlink()
+        self.env['stock.demand.estimate.index']._refresh(keys)
+        return res
+
     @api.multi
     def name_get(self):
         res = []
@@ -162,3 +213,76 @@ class StockDemandEstimate(models.Model):
             days = (abs(overlap_date_end - overlap_date_start)).days + 1
             return days * self.daily_qty
         return 0.0
+
+    @api.model
+    def get_quantities_by_date_ranges(
+            self, date_ranges, product_ids=None, location_ids=None):
+        """Aggregate the estimated demand of many products and locations over
+        several date ranges, in a single query. Each estimate counts for its
+        daily quantity times the number of days it overlaps each range, as
+        in get_quantity_by_date_range.
+        :param date_ranges: list of tuples (date_start, date_end), of dates
+                            or strings, each range being computed once
+        :param product_ids: list of product ids, all of them if None
+        :param location_ids: list of location ids, all of them if None
+        :return: dict {(product_id, location_id, date_start, date_end): qty}
+                 with the dates as given in date_ranges, without the
+                 combinations having no estimate
+        """
+        # The ranges given as they were, by range of dates
+        ranges = {}
+        for date_start, date_end in date_ranges:
+            ranges.setdefault((
+                fields.Date.to_date(date_start),
+                fields.Date.to_date(date_end),
+            ), set()).add((date_start, date_end))
+        if not ranges:
+            return {}
+        domain = [('duration', '!=', 0)]
+        if product_ids is not None:
+            domain.append(('product_id', 'in', list(product_ids)))
+        if location_ids is not None:
+            domain.append(('location_id', 'in', list(location_ids)))
+        query = self._where_calc(domain)
+        self._apply_ir_rules(query, 'read')
+        from_clause, where_clause, params = query.get_sql()
+        dates_start, dates_end = zip(*ranges)
+        # pylint: disable=sql-injection
+        self.env.cr.execute("""
+            SELECT "stock_demand_estimate"."product_id",
+                "stock_demand_estimate"."location_id",
+                ranges.date_start, ranges.date_end,
+                SUM((LEAST("stock_demand_estimate"."date_to", ranges.date_end)
+                     - GREATEST("stock_demand_estimate"."date_from",
+                                ranges.date_start) + 1)
+                    * "stock_demand_estimate"."product_qty"::float
+                    / "stock_demand_estimate"."duration")
+            FROM {from_clause},
+                unnest(%s::date[], %s::date[]) AS ranges(date_start, date_end)
+            WHERE {where_clause}
+            AND "stock_demand_estimate"."date_from" <= ranges.date_end
+            AND "stock_demand_estimate"."date_to" >= ranges.date_start
+            GROUP BY "stock_demand_estimate"."product_id",
+                "stock_demand_estimate"."location_id",
+                ranges.date_start, ranges.date_end
+        """.format(from_clause=from_clause, where_clause=where_clause),
+            [list(dates_start), list(dates_end)] + params)
+        return {
+            (product_id, location_id, date_start, date_end): qty
+            for product_id, location_id, range_start, range_end, qty
+            in self.env.cr.fetchall()
+            for date_start, date_end in ranges[(range_start, range_end)]}
+
+    @api.model
+    def get_quantities_by_date_range(
+            self, date_start, date_end, product_ids=None, location_ids=None):
+        """Aggregate the estimated demand of many products and locations over
+        a date range, see get_quantities_by_date_ranges
+        :return: dict {(product_id, location_id): qty}
+        """
+        return {
+            (product_id, location_id): qty
+            for (product_id, location_id, _start, _end), qty
+            in self.get_quantities_by_date_ranges(
+                [(date_start, date_end)], product_ids=product_ids,
+                location_ids=location_ids).items()}
@@ -0,0 +1,183 @@
+# Copyright 2026 Omdatech
+# License LGPL-3.0 or later (https://www.gnu.org/licenses/lgpl.html).
+
+from odoo import api, fields, models, tools
+
+
+class StockDemandEstimateIndex(models.Model):
+    """Cumulative daily demand of the estimates of each product, location
+    and company, from the first day of their estimates to the last one, so
+    that the demand over any date range is the difference of two values of
+    the series. The series is stored as an array in the cumulative_qty
+    column, and kept up to date when the columns of the estimates are
+    written, including by the recomputation of their stored fields. The
+    estimates changed with raw SQL need a rebuild.
+    """
+    _name = 'stock.demand.estimate.index'
+    _description = 'Stock Demand Estimate Index'
+    _order = 'product_id, location_id, company_id'
+    _log_access = False
+
+    product_id = fields.Many2one(
+        comodel_name="product.product",
+        string="Product",
+        required=True,
+        index=True,
+        readonly=True,
+        ondelete='cascade',
+    )
+    location_id = fields.Many2one(
+        comodel_name="stock.location",
+        string="Location",
+        required=True,
+        index=True,
+        readonly=True,
+        ondelete='cascade',
+    )
+    company_id = fields.Many2one(
+        comodel_name='res.company',
+        string='Company',
+        required=True,
+        index=True,
+        readonly=True,
+        ondelete='cascade',
+    )
+    date_start = fields.Date(string="From", readonly=True)
+    date_end = fields.Date(string="To", readonly=True)
+
+    _sql_constraints = [
+        ('product_location_uniq',
+         'unique(product_id, location_id, company_id)',
+         'The demand is indexed once per product, location and company.'),
+    ]
+
+    @api.model_cr
+    def init(self):
+        # Not a field: the ORM has no array type
+        if not tools.column_exists(self._cr, self._table, 'cumulative_qty'):
+            tools.create_column(
+                self._cr, self._table, 'cumulative_qty', 'float8[]',
+                'Cumulative daily demand from the start date')
+
+    @api.model
+    def _refresh(self, keys):
+        """Compute again the series of some products, locations and companies
+        :param keys: iterable of tuples (product_id, location_id, company_id)
+        """
+        keys = tuple(set(keys))
+        if not keys:
+            return
+        self.env.cr.execute("""
+            DELETE FROM stock_demand_estimate_index
+            WHERE (product_id, location_id, company_id) IN %s
+        """, (keys,))
+        self.env.cr.execute("""
+            WITH estimates AS (
+                SELECT product_id, location_id, company_id, date_from,
+                    date_to, product_qty::float / duration AS daily_qty
+                FROM stock_demand_estimate
+                WHERE duration != 0
+                AND (product_id, location_id, company_id) IN %s
+            ), bounds AS (
+                SELECT product_id, location_id, company_id,
+                    MIN(date_from) AS date_start, MAX(date_to) AS date_end
+                FROM estimates
+                GROUP BY product_id, location_id, company_id
+            ), daily AS (
+                SELECT bounds.product_id, bounds.location_id,
+                    bounds.company_id, series.day::date AS day,
+                    COALESCE(SUM(estimates.daily_qty), 0.0) AS qty
+                FROM bounds
+                CROSS JOIN generate_series(
+                    bounds.date_start, bounds.date_end, interval '1 day')
+                    AS series(day)
+                LEFT JOIN estimates
+                    ON estimates.product_id = bounds.product_id
+                    AND estimates.location_id = bounds.location_id
+                    AND estimates.company_id = bounds.company_id
+                    AND series.day::date
+                        BETWEEN estimates.date_from AND estimates.date_to
+                GROUP BY bounds.product_id, bounds.location_id,
+                    bounds.company_id, series.day
+            )
+            INSERT INTO stock_demand_estimate_index (
+                product_id, location_id, company_id, date_start, date_end,
+                cumulative_qty)
+            SELECT product_id, location_id, company_id, MIN(day), MAX(day),
+                array_agg(cumulative_qty ORDER BY day)
+            FROM (
+                SELECT product_id, location_id, company_id, day,
+                    SUM(qty) OVER (
+                        PARTITION BY product_id, location_id, company_id
+                        ORDER BY day) AS cumulative_qty
+                FROM daily
+            ) cumulated
+            GROUP BY product_id, location_id, company_id
+        """, (keys,))
+        self.invalidate_cache()
+
+    @api.model
+    def rebuild(self):
+        """Compute again the series of all the products, locations and
+        companies"""
+        self.env.cr.execute("DELETE FROM stock_demand_estimate_index")
+        self.env.cr.execute("""
+            SELECT DISTINCT product_id, location_id, company_id
+            FROM stock_demand_estimate
+        """)
+        self._refresh(self.env.cr.fetchall())
+
+    @api.model
+    def get_quantities(
+            self, date_start, date_end, product_ids=None, location_ids=None):
+        """Get the estimated demand over a date range from the index, with
+        two lookups per product, location and company. Only the series of
+        the products, locations and companies of the estimates the user can
+        read are summed, each of them for all its estimates.
+        :param date_start: date, first day of the range
+        :param date_end: date, last day of the range
+        :param product_ids: list of product ids, all of them if None
+        :param location_ids: list of location ids, all of them if None
+        :return: dict {(product_id, location_id): qty} without the products
+                 and locations having no estimate over the range
+        """
+        date_start = fields.Date.to_date(date_start)
+        date_end = fields.Date.to_date(date_end)
+        domain = [('duration', '!=', 0)]
+        where = ["date_start <= %s", "date_end >= %s"]
+        params = [date_end, date_start]
+        if product_ids is not None:
+            domain.append(('product_id', 'in', list(product_ids)))
+            where.append("product_id IN %s")
+            params.append(tuple(product_ids) or (None,))
+        if location_ids is not None:
+            domain.append(('location_id', 'in', list(location_ids)))
+            where.append("location_id IN %s")
+            params.append(tuple(location_ids) or (None,))
+        estimate_model = self.env['stock.demand.estimate']
+        query = estimate_model._where_calc(domain)
+        estimate_model._apply_ir_rules(query, 'read')
+        from_clause, where_clause, where_params = query.get_sql()
+        # pylint: disable=sql-injection
+        self.env.cr.execute("""
+            SELECT product_id, location_id,
+                SUM(cumulative_qty[LEAST(%s, date_end) - date_start + 1]
+                    - COALESCE(cumulative_qty[GREATEST(%s, date_start)
+                                              - date_start], 0.0))
+            FROM stock_demand_estimate_index
+            WHERE {where}
+            AND (product_id, location_id, company_id) IN (
+                SELECT "stock_demand_estimate"."product_id",
+                    "stock_demand_estimate"."location_id",
+                    "stock_demand_estimate"."company_id"
+                FROM {from_clause}
+                WHERE {where_clause}
+            )
+            GROUP BY product_id, location_id
+        """.format(
+            where=" AND ".join(where), from_clause=from_clause,
+            where_clause=where_clause),
+            [date_end, date_start] + params + where_params)
+        return {
+            (product_id, location_id): qty
+            for product_id, location_id, qty in self.env.cr.fetchall()}
@@ -1,9 +1,11 @@
 # Copyright 2017-19 ForgeFlow S.L. (https://www.forgeflow.com)
 # License LGPL-3.0 or later (https://www.gnu.org/licenses/lgpl.html).
 
+from odoo import fields
 from odoo.tests.common import SavepointCase
 
 from datetime import date, timedelta as td
+from unittest.mock import patch
 
 
 class TestStockDemandEstimate(SavepointCase):
@@ -123,3 +125,177 @@ class TestStockDemandEstimate(SavepointCase):
         res = estimate.get_quantity_by_date_range(
             estimate.date_from, estimate.date_to)
         self.assertEqual(res, 100)
+
+    def test_04_get_quantities_by_date_ranges(self):
+        """Aggregate the demand of several estimates at once."""
+        location_2 = self.stock_location_model.create({
+            'name': 'Other place',
+            'usage': 'production',
+        })
+        date_from = date.today() + td(days=10)
+        estimates = self.estimate_model
+        for location, days, qty, uom in (
+                (self.location, 0, 100.0, self.uom_unit),
+                (self.location, 5, 10.0, self.uom_dozen),
+                (location_2, 20, 30.0, self.uom_unit)):
+            estimates |= self.estimate_model.create({
+                "product_id": self.product_1.id,
+                "location_id": location.id,
+                "manual_date_from": date_from + td(days=days),
+                "manual_duration": 10,
+                "product_uom_qty": qty,
+                "product_uom": uom.id,
+            })
+        date_ranges = [
+            (date_from + td(days=3), date_from + td(days=7)),
+            (date_from + td(days=8), date_from + td(days=25)),
+            (date_from + td(days=40), date_from + td(days=50)),
+        ]
+        res = self.estimate_model.get_quantities_by_date_ranges(
+            date_ranges, product_ids=self.product_1.ids)
+        for date_start, date_end in date_ranges:
+            for location in self.location | location_2:
+                expected = sum(
+                    estimate.get_quantity_by_date_range(date_start, date_end)
+                    for estimate in estimates
+                    if estimate.location_id == location)
+                self.assertAlmostEqual(res.get(
+                    (self.product_1.id, location.id, date_start, date_end),
+                    0.0), expected)
+        self.assertEqual(len(res), 3)
+        # The same ranges given twice, or as strings, are computed once
+        date_start, date_end = date_ranges[1]
+        str_range = (
+            fields.Date.to_string(date_start), fields.Date.to_string(date_end))
+        res_twice = self.estimate_model.get_quantities_by_date_ranges(
+            date_ranges + [date_ranges[1], str_range],
+            product_ids=self.product_1.ids)
+        self.assertEqual(len(res_twice), 5)
+        for location in self.location | location_2:
+            key = (self.product_1.id, location.id)
+            self.assertAlmostEqual(
+                res_twice[key + str_range], res[key + date_ranges[1]])
+            self.assertAlmostEqual(
+                res_twice[key + date_ranges[1]], res[key + date_ranges[1]])
+        res = self.estimate_model.get_quantities_by_date_range(
+            date_from + td(days=3), date_from + td(days=7),
+            location_ids=self.location.ids)
+        # 5 days of 10 units, and 3 days of 12 units
+        self.assertEqual(list(res), [(self.product_1.id, self.location.id)])
+        self.assertAlmostEqual(
+            res[(self.product_1.id, self.location.id)], 86.0)
+
+    def test_05_demand_index(self):
+        """The index gives the same demand as the estimates."""
+        index_model = self.env['stock.demand.estimate.index']
+        date_from = date.today() + td(days=10)
+        estimates = self.estimate_model
+        for days, duration, qty in ((0, 10, 100.0), (5, 10, 50.0),
+                                    (30, 5, 20.0)):
+            estimates |= self.estimate_model.create({
+                "product_id": self.product_1.id,
+                "location_id": self.location.id,
+                "manual_date_from": date_from + td(days=days),
+                "manual_duration": duration,
+                "product_uom_qty": qty,
+            })
+        key = (self.product_1.id, self.location.id)
+        index = index_model.search([
+            ('product_id', '=', self.product_1.id),
+            ('location_id', '=', self.location.id)])
+        self.assertEqual(index.date_start, date_from)
+        self.assertEqual(index.date_end, date_from + td(days=34))
+
+        def check(estimates):
+            for start, end in ((-5, 3), (3, 7), (8, 25), (20, 29),
+                               (0, 34), (-10, 50), (40, 50)):
+                date_start = date_from + td(days=start)
+                date_end = date_from + td(days=end)
+                expected = sum(
+                    estimate.get_quantity_by_date_range(date_start, date_end)
+                    for estimate in estimates)
+                res = index_model.get_quantities(
+                    date_start, date_end, product_ids=self.product_1.ids,
+                    location_ids=self.location.ids)
+                self.assertAlmostEqual(res.get(key, 0.0), expected)
+
+        check(estimates)
+        estimates[1].product_uom_qty = 80.0
+        check(estimates)
+        estimates[2].unlink()
+        check(estimates[:2])
+        estimates[:2].write({'location_id': self.location.copy().id})
+        self.assertFalse(index_model.get_quantities(
+            date_from, date_from + td(days=40),
+            location_ids=self.location.ids))
+        index_model.rebuild()
+        self.assertEqual(len(index_model.search([
+            ('product_id', '=', self.product_1.id)])), 1)
+
+    def test_06_demand_index_company(self):
+        """The index keeps the demand of each company apart."""
+        index_model = self.env['stock.demand.estimate.index']
+        other_company = self.env['res.company'].create({
+            'name': 'Other company',
+            'parent_id': False,
+        })
+        date_from = date.today() + td(days=10)
+        for company, qty in ((self.company, 100.0), (other_company, 50.0)):
+            self.estimate_model.create({
+                "product_id": self.product_1.id,
+                "location_id": self.location.id,
+                "company_id": company.id,
+                "manual_date_from": date_from,
+                "manual_duration": 10,
+                "product_uom_qty": qty,
+            })
+        key = (self.product_1.id, self.location.id)
+        args = (date_from, date_from + td(days=9), self.product_1.ids)
+        self.assertAlmostEqual(index_model.get_quantities(*args)[key], 150.0)
+        self.assertAlmostEqual(
+            index_model.sudo(self.user).get_quantities(*args)[key], 100.0)
+
+    def test_07_demand_index_stored_recompute(self):
+        """The index follows the fields stored without calling write."""
+        index_model = self.env['stock.demand.estimate.index']
+        date_from = date.today() + td(days=10)
+        estimate = self.estimate_model.create({
+            "product_id": self.product_1.id,
+            "location_id": self.location.id,
+            "manual_date_from": date_from,
+            "manual_duration": 10,
+            "product_uom_qty": 100.0,
+        })
+        # As when the recomputation of the stored fields writes them
+        estimate._write({'product_qty': 300.0})
+        res = index_model.get_quantities(
+            date_from, date_from + td(days=9),
+            product_ids=self.product_1.ids)
+        self.assertAlmostEqual(
+            res[(self.product_1.id, self.location.id)], 300.0)
+
+    def test_08_demand_index_single_refresh(self):
+        """The index is refreshed once per create and write."""
+        index_class = type(self.env['stock.demand.estimate.index'])
+        date_from = date.today() + td(days=10)
+        with patch.object(
+                index_class, '_refresh', autospec=True,
+                side_effect=index_class._refresh) as refresh:
+            estimates = self.estimate_model.create([{
+                "product_id": self.product_1.id,
+                "location_id": self.location.id,
+                "manual_date_from": date_from + td(days=days),
+                "manual_duration": 10,
+                "product_uom_qty": 100.0,
+            } for days in range(5)])
+            self.assertEqual(refresh.call_count, 1)
+            estimates.write({
+                "manual_duration": 5,
+                "product_uom_qty": 50.0,
+            })
+            self.assertEqual(refresh.call_count, 2)
+        res = self.env['stock.demand.estimate.index'].get_quantities(
+            date_from, date_from + td(days=8),
+            product_ids=self.product_1.ids)
+        self.assertAlmostEqual(
+            res[(self.product_1.id, self.location.id)], 250.0)
@@ -0,0 +1,17 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+{
+    "name": "Stock Location Warehouse Cache",
+    "summary": "Resolve the warehouse of many locations at once, from the "
+               "cached paths of the warehouses.",
+    "version": "12.0.1.0.0",
+    "author": "Omdatech, Odoo Community Association (OCA)",
+    "website": "https://github.com/OCA/stock-logistics-warehouse",
+    "category": "Warehouse Management",
+    "depends": [
+        "stock",
+    ],
+    "license": "AGPL-3",
+    "installable": True,
+    "application": False,
+}
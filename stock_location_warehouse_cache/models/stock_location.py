@@ -0,0 +1,93 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models, tools
+
+
+class StockLocation(models.Model):
+    _inherit = 'stock.location'
+
+    @api.model
+    @tools.ormcache()
+    def _get_warehouse_view_paths(self):
+        """ Get the parent_path of the view location of each active
+        warehouse, in the order get_warehouse looks for them. The result is
+        kept in the registry cache until a warehouse or its view location
+        changes.
+        :return: tuple of (parent_path, warehouse_id)
+        """
+        self.env.cr.execute("""
+            SELECT view.parent_path, wh.id
+            FROM stock_warehouse wh
+            JOIN stock_location view ON view.id = wh.view_location_id
+            WHERE wh.active
+            ORDER BY wh.sequence, wh.id
+        """)
+        return tuple(self.env.cr.fetchall())
+
+    @api.multi
+    def _get_warehouse_ids(self):
+        """ Resolve the warehouse of each location, as get_warehouse does,
+        from the parent_path of the locations and the cached paths of the
+        warehouses
+        :return: dict {location_id: warehouse_id or None}
+        """
+        view_paths = self._get_warehouse_view_paths()
+        res = {}
+        for location in self.sudo().with_context(prefetch_fields=False):
+            path = location.parent_path or ''
+            res[location.id] = next((
+                warehouse_id for view_path, warehouse_id in view_paths
+                if path.startswith(view_path)), None)
+        return res
+
+    @api.multi
+    def get_warehouses(self):
+        """ Resolve the warehouse of each location at once, see
+        _get_warehouse_ids
+        :return: dict {location_id: stock.warehouse recordset, empty for the
+                 locations outside of any warehouse}
+        """
+        real = self.filtered(lambda loc: isinstance(loc.id, int))
+        warehouse_ids = real._get_warehouse_ids()
+        warehouses = self.env['stock.warehouse'].browse(
+            set(filter(None, warehouse_ids.values())))
+        res = {
+            location_id: warehouses.browse(
+                warehouse_id or [], prefetch=warehouses._prefetch)
+            for location_id, warehouse_id in warehouse_ids.items()}
+        # The new records are not in the database yet
+        for location in self - real:
+            res[location.id] = location.get_warehouse()
+        return res
+
+    @api.multi
+    def get_cached_warehouse(self):
+        """ Same as get_warehouse, for a single location, through the cache
+        of get_warehouses """
+        if not self:
+            return self.env['stock.warehouse']
+        self.ensure_one()
+        return self.get_warehouses()[self.id]
+
+    @api.model
+    def _clear_warehouse_cache(self):
+        """ Forget the paths of the warehouses, including the ones read with
+        the data of the current transaction if it is rolled back """
+        self.clear_caches()
+        self.env.cr.after('rollback', self.pool._clear_cache)
+
+    @api.multi
+    def write(self, vals):
+        # Moving the view location of a warehouse, or one of its parents,
+        # changes the path of the warehouse
+        moved_paths = 'location_id' in vals and [
+            path for path in self.sudo().mapped('parent_path') if path]
+        res = super(StockLocation, self).write(vals)
+        if moved_paths:
+            self.invalidate_cache(fnames=['parent_path'])
+            if any(view_path.startswith(path)
+                   for view_path, _ in self._get_warehouse_view_paths()
+                   for path in moved_paths):
+                self._clear_warehouse_cache()
+        return res
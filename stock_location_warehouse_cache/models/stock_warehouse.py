@@ -0,0 +1,30 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+# The fields telling which warehouse a location belongs to
+WAREHOUSE_CACHE_FIELDS = {'active', 'sequence', 'view_location_id'}
+
+
+class StockWarehouse(models.Model):
+    _inherit = 'stock.warehouse'
+
+    @api.model
+    def create(self, vals):
+        res = super(StockWarehouse, self).create(vals)
+        self.env['stock.location']._clear_warehouse_cache()
+        return res
+
+    @api.multi
+    def write(self, vals):
+        res = super(StockWarehouse, self).write(vals)
+        if WAREHOUSE_CACHE_FIELDS.intersection(vals):
+            self.env['stock.location']._clear_warehouse_cache()
+        return res
+
+    @api.multi
+    def unlink(self):
+        res = super(StockWarehouse, self).unlink()
+        self.env['stock.location']._clear_warehouse_cache()
+        return res
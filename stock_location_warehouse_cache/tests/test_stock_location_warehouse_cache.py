@@ -0,0 +1,70 @@
+# Copyright 2026 Omdatech
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from unittest.mock import patch
+
+from odoo.tests.common import TransactionCase
+
+
+class TestStockLocationWarehouseCache(TransactionCase):
+
+    def setUp(self):
+        super(TestStockLocationWarehouseCache, self).setUp()
+        self.location_model = self.env['stock.location']
+        self.warehouse = self.env['stock.warehouse'].create({
+            'name': 'Cached warehouse',
+            'code': 'CWH',
+        })
+        self.bin = self.location_model.create({
+            'name': 'Bin',
+            'usage': 'internal',
+            'location_id': self.warehouse.lot_stock_id.id,
+        })
+
+    def test_get_warehouses(self):
+        locations = self.location_model.search([])
+        warehouses = locations.get_warehouses()
+        self.assertEqual(set(warehouses), set(locations.ids))
+        for location in locations:
+            self.assertEqual(
+                warehouses[location.id], location.get_warehouse())
+        self.assertEqual(warehouses[self.bin.id], self.warehouse)
+        customers = self.env.ref('stock.stock_location_customers')
+        self.assertFalse(warehouses[customers.id])
+        self.assertFalse(self.location_model.get_cached_warehouse())
+        # The warehouses are now resolved without any query
+        queries = self.cr.sql_log_count
+        self.assertEqual(self.bin.get_cached_warehouse(), self.warehouse)
+        locations.get_warehouses()
+        self.assertEqual(self.cr.sql_log_count, queries)
+
+    def test_cache_invalidation(self):
+        self.assertEqual(self.bin.get_cached_warehouse(), self.warehouse)
+        other_warehouse = self.env['stock.warehouse'].create({
+            'name': 'Other warehouse',
+            'code': 'OWH',
+        })
+        self.bin.location_id = other_warehouse.lot_stock_id
+        self.assertEqual(self.bin.get_cached_warehouse(), other_warehouse)
+        self.bin.location_id = self.env.ref('stock.stock_location_customers')
+        self.assertFalse(self.bin.get_cached_warehouse())
+
+    def test_targeted_invalidation(self):
+        self.assertEqual(self.bin.get_cached_warehouse(), self.warehouse)
+        other_warehouse = self.env['stock.warehouse'].create({
+            'name': 'Other warehouse',
+            'code': 'OWH',
+        })
+        self.assertEqual(self.bin.get_cached_warehouse(), self.warehouse)
+        # Moving a bin keeps the cache of the registry
+        with patch.object(
+                type(self.registry), '_clear_cache') as clear_cache:
+            self.bin.location_id = other_warehouse.lot_stock_id
+            clear_cache.assert_not_called()
+        self.assertEqual(self.bin.get_cached_warehouse(), other_warehouse)
+        # Moving the view location of a warehouse changes its path
+        self.warehouse.view_location_id.location_id = \
+            other_warehouse.view_location_id
+        self.assertEqual(
+            self.warehouse.lot_stock_id.get_cached_warehouse(),
+            self.warehouse.lot_stock_id.get_warehouse())
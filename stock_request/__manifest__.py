@@ -4,7 +4,7 @@
 {
     "name": "Stock Request",
     "summary": "Internal request for stock",
-    "version": "12.0.1.1.7",
+    "version": "12.0.1.1.8",
     "license": "LGPL-3",
     "website": "https://github.com/stock-logistics-warehouse",
     "author": "Eficent, "
@@ -12,6 +12,7 @@
     "category": "Warehouse Management",
     "depends": [
         "stock",
+        "stock_location_warehouse_cache",
     ],
     "data": [
         "security/stock_request_security.xml",
@@ -176,7 +176,7 @@ class StockRequest(models.AbstractModel):
             # the onchange, as it could lead to inconsistencies.
             return res
         if self.warehouse_id:
-            loc_wh = self.location_id.sudo().get_warehouse()
+            loc_wh = self.location_id.sudo().get_cached_warehouse()
             if self.warehouse_id != loc_wh:
                 self.location_id = self.warehouse_id.lot_stock_id.id
             if self.warehouse_id.company_id != self.company_id:
@@ -186,7 +186,7 @@ class StockRequest(models.AbstractModel):
     @api.onchange('location_id')
     def onchange_location_id(self):
         if self.location_id:
-            loc_wh = self.location_id.sudo().get_warehouse()
+            loc_wh = self.location_id.sudo().get_cached_warehouse()
             if loc_wh and self.warehouse_id != loc_wh:
                 self.warehouse_id = loc_wh
                 self.with_context(